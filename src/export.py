@@ -1,20 +1,182 @@
 import asyncio
+import contextlib
+import csv
 import datetime
+import functools
 import logging
 import re
+import time
 import pytz
 import numpy as np
-from typing import List, Dict, Optional
+import pandas as pd
+from array import array
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple
+from xml.sax.saxutils import escape
 from viam.app.viam_client import ViamClient, DataClient
 from viam.rpc.dial import DialOptions, Credentials
 from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
 
 LOGGER = logging.getLogger(__name__)
 
+UTC = pytz.utc
+
+# A data point is a (time_received, readings) pair
+DataPoint = Tuple[datetime.datetime, Dict]
+
+_RETRY_AFTER = re.compile(r"retry[-_ ]after\D{0,5}?(\d+(?:\.\d+)?)", re.IGNORECASE)
+# Longest server-requested retry delay honoured, in seconds
+_MAX_RETRY_AFTER = 60.0
+
+@functools.lru_cache(maxsize=None)
+def _load_timezone(tz_str: str) -> pytz.BaseTzInfo:
+    """Load a pytz timezone once per name."""
+    return pytz.timezone(tz_str)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Return the server-requested retry delay in seconds carried by an error, if any.
+
+    Delays outside [0, _MAX_RETRY_AFTER] are ignored so the caller falls back to its own backoff.
+    """
+    delay = None
+    value = getattr(error, "retry_after", None)
+    if value is not None:
+        try:
+            delay = float(value)
+        except (TypeError, ValueError):
+            pass
+    if delay is None:
+        match = _RETRY_AFTER.search(str(error))
+        delay = float(match.group(1)) if match else None
+    if delay is None or not 0 <= delay <= _MAX_RETRY_AFTER:
+        return None
+    return delay
+
+def _cell_xml(ref: str, value, date_style: int = 1, style: Optional[int] = None) -> str:
+    """Render one worksheet cell; empty and non-finite values produce no cell unless it has a style."""
+    s = "" if style is None else f' s="{style}"'
+    if value is None:
+        return f'<c r="{ref}"{s}/>' if s else ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if value != value or value in (float("inf"), float("-inf")):
+            return f'<c r="{ref}"{s}/>' if s else ""
+        return f'<c r="{ref}"{s}><v>{value!r}</v></c>'
+    if isinstance(value, datetime.datetime):
+        return f'<c r="{ref}" s="{date_style}"><v>{to_excel(value)!r}</v></c>'
+    return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+def rows_xml(rows, first_row: int = 1, date_style: int = 1,
+             row_styles: Optional[Dict[int, Tuple[str, Dict[int, int]]]] = None):
+    """Yield `<row>` elements for rows of cell values, numbering rows from first_row.
+
+    Timestamps are written as Excel serial dates using the cellXfs index date_style.
+    row_styles maps a row number to extra `<row>` attributes and the cellXfs index
+    of each 1-based column; cells in that row other than timestamps take their
+    column's style, and styled columns without a value are written as empty cells.
+    """
+    columns = []
+    for row_num, row in enumerate(rows, first_row):
+        attrs, styles = row_styles.get(row_num, ("", None)) if row_styles else ("", None)
+        width = max(len(row), max(styles, default=0)) if styles else len(row)
+        while len(columns) < width:
+            columns.append(get_column_letter(len(columns) + 1))
+        if styles:
+            cells = "".join([
+                _cell_xml(f"{columns[i]}{row_num}", row[i] if i < len(row) else None, date_style, styles.get(i + 1))
+                for i in range(width)
+            ])
+        else:
+            cells = "".join([_cell_xml(f"{column}{row_num}", value, date_style) for column, value in zip(columns, row)])
+        yield f'<row r="{row_num}"{attrs}>{cells}</row>'
+
+class BucketColumns:
+    """Per-key columns of bucket ids and values, filled one page of data points at a time.
+
+    Only integer bucket ids and float values are kept between pages, so the raw
+    reading dicts can be released as soon as their page has been added.
+    """
+
+    def __init__(self, bucket_period: datetime.timedelta, include_key=None):
+        self.bucket_period = bucket_period
+        self.period_us = bucket_period // datetime.timedelta(microseconds=1)
+        self.include_key = include_key
+        self.tzinfo = None
+        # One array of bucket ids per page, with one id per data point
+        self.row_ids = []
+        # Typed buffers store raw machine values instead of boxed Python objects
+        self.columns = defaultdict(lambda: (array("q"), array("d")))
+        # Include decisions are made once per distinct key rather than once per value
+        self._included = {}
+
+    def add(self, data: List[DataPoint]):
+        """Floor a page of data points to bucket ids and append their readings to the columns."""
+        if not data:
+            return
+        if not self.row_ids:
+            self.tzinfo = data[0][0].tzinfo
+        # Exact integer arithmetic on epoch microseconds; naive timestamps are UTC
+        microseconds = pd.to_datetime([time_received for time_received, _ in data], utc=True).as_unit("us").asi8
+        bucket_ids = np.floor_divide(microseconds, self.period_us)
+        self.row_ids.append(bucket_ids)
+
+        included, include_key, columns = self._included, self.include_key, self.columns
+        for (_, readings), bucket_id in zip(data, bucket_ids.tolist()):
+            for key, value in readings.items():
+                keep = included.get(key)
+                if keep is None:
+                    keep = included[key] = include_key is None or include_key(key)
+                if not keep:
+                    continue
+                column = columns[key]
+                column[0].append(bucket_id)
+                try:
+                    column[1].append(value)
+                except TypeError:
+                    # Match NumPy's float conversion: None becomes NaN, numeric strings parse
+                    column[1].append(float("nan") if value is None else float(value))
+
+class Backpressure:
+    """Additive-increase/multiplicative-decrease controller for page-request concurrency.
+
+    The window starts at a single probe page and doubles after each fast wave
+    until the first failed or slow wave, after which it grows additively.
+    """
+
+    def __init__(self, cmax: int, target_latency: float = 10.0, alpha: float = 1.0, beta: float = 0.5):
+        self.c = 1.0
+        self.cmax = max(1, cmax)
+        self.target_latency = target_latency
+        self.alpha = alpha
+        self.beta = beta
+        self.slow_start = True
+
+    @property
+    def window(self) -> int:
+        """Number of page requests to issue in the next wave."""
+        return max(1, min(self.cmax, int(self.c)))
+
+    def on_success(self, latency: float):
+        """Grow the window after a fast wave, shrink it after a slow one."""
+        if latency <= self.target_latency:
+            grown = self.c * 2 if self.slow_start else self.c + self.alpha
+            self.c = min(self.cmax, grown)
+        else:
+            self.on_error()
+
+    def on_error(self):
+        """Shrink the window after a failed wave and leave slow start."""
+        self.slow_start = False
+        self.c = max(1.0, self.c * self.beta)
+
 class DataExporter:
     """Data exporter for retrieving and processing Viam API data into Excel workbooks."""
 
-    def __init__(self, api_key_id: str, api_key: str, org_id: str, location_id: str, timezone: str = "America/New_York"):
+    def __init__(self, api_key_id: str, api_key: str, org_id: str, location_id: str, timezone: str = "America/New_York",
+                 concurrency: int = 4, include_keys_regex: Optional[str] = ".*_raw"):
         """Initialize the data exporter.
 
         Args:
@@ -23,37 +185,70 @@ class DataExporter:
             org_id: Viam organization ID
             location_id: Viam location ID
             timezone: Timezone for timestamps (default: America/New_York)
+            concurrency: Upper bound on page requests in flight (default: 4)
+            include_keys_regex: Default regex pattern for keys to include (default: .*_raw)
         """
         self.api_key_id = api_key_id
         self.api_key = api_key
         self.org_id = org_id
         self.location_id = location_id
         self.timezone = self._parse_timezone(timezone)
+        self.concurrency = max(1, int(concurrency))
         self.data_client = None
+        self._client = None
+        # Exports share one connection: the lock keeps concurrent first callers from each dialing,
+        # and a failed export only marks it stale so the last export still using it closes it
+        self._connect_lock = asyncio.Lock()
+        self._active_exports = 0
+        self._client_stale = False
+        self._key_filters = {}
+        self.include_keys_regex = include_keys_regex
+        if include_keys_regex:
+            # Compile up front so exports start with the filter ready
+            self._key_filter(include_keys_regex)
 
     def _parse_timezone(self, tz_str: str) -> pytz.timezone:
         """Convert a timezone string to a pytz timezone object."""
         try:
-            return pytz.timezone(tz_str)
+            return _load_timezone(tz_str)
         except Exception as e:
             LOGGER.error(f"Invalid timezone '{tz_str}': {e}")
-            return pytz.timezone("America/New_York")
+            return _load_timezone("America/New_York")
 
     async def connect(self) -> ViamClient:
-        """Connect to the Viam API."""
-        LOGGER.info("Connecting to Viam API")
-        try:
-            dial_options = DialOptions(
-                credentials=Credentials(type="api-key", payload=self.api_key),
-                auth_entity=self.api_key_id
-            )
-            client = await ViamClient.create_from_dial_options(dial_options)
-            self.data_client = client.data_client
-            LOGGER.info("Connected to Viam API")
-            return client
-        except Exception as e:
-            LOGGER.error(f"Failed to connect to Viam API: {e}")
-            raise
+        """Connect to the Viam API, reusing the open connection if there is one."""
+        async with self._connect_lock:
+            if self._client is not None:
+                return self._client
+            LOGGER.info("Connecting to Viam API")
+            try:
+                dial_options = DialOptions(
+                    credentials=Credentials(type="api-key", payload=self.api_key),
+                    auth_entity=self.api_key_id
+                )
+                client = await ViamClient.create_from_dial_options(dial_options)
+                self._client = client
+                self.data_client = client.data_client
+                self._client_stale = False
+                LOGGER.info("Connected to Viam API")
+                return client
+            except Exception as e:
+                LOGGER.error(f"Failed to connect to Viam API: {e}")
+                raise
+
+    def release(self):
+        """Close the Viam API connection now, or once the exports still using it have finished."""
+        self._client_stale = True
+        if self._active_exports == 0:
+            self.close()
+            self._client_stale = False
+
+    def close(self):
+        """Close the Viam API connection, if open."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self.data_client = None
 
     async def export_to_excel(self,
                               output_file: str,
@@ -62,8 +257,9 @@ class DataExporter:
                               end_time: datetime.datetime,
                               bucket_period: str = "PT5M",
                               bucket_method: str = "pct99",
-                              include_keys_regex: str = ".*_raw",
-                              tab_name: str = "RAW") -> Optional[str]:
+                              include_keys_regex: Optional[str] = None,
+                              tab_name: str = "RAW",
+                              engine: str = "openpyxl") -> Optional[str]:
         """Export data to an Excel file.
 
         Args:
@@ -73,8 +269,11 @@ class DataExporter:
             end_time: End time for the data query
             bucket_period: Time bucket period (ISO8601 duration, default: PT5M)
             bucket_method: Aggregation method (default: pct99)
-            include_keys_regex: Regex pattern for keys to include (default: .*_raw)
+            include_keys_regex: Regex pattern for keys to include; an empty string disables
+                filtering (default: the exporter's pattern)
             tab_name: Name of the worksheet tab (default: RAW)
+            engine: "openpyxl" writes a workbook; "csv" writes a CSV file with ISO
+                timestamps and no tab instead (default: openpyxl)
 
         Returns:
             Path to the created Excel file or None on failure
@@ -90,80 +289,205 @@ class DataExporter:
                     LOGGER.warning("isodate package not available, using default 5-minute bucket")
                     bucket_period = datetime.timedelta(minutes=5)
 
-            # Connect to Viam API
-            client = await self.connect()
+            if include_keys_regex is None:
+                include_keys_regex = self.include_keys_regex
+
+            # Connect to Viam API; the connection stays open across exports
+            self._active_exports += 1
             try:
+                await self.connect()
                 match_predicate = {
                     "organization_id": self.org_id,
                     "component_name": resource_name,
                     "time_received": {"$gte": start_time, "$lt": end_time}
                 }
-                pipeline = [{"$match": match_predicate}, {"$sort": {"time_received": 1}}]
-                all_data = []
-                skip, limit = 0, 1000
-
-                while True:
-                    LOGGER.info(f"Retrieving data from {skip} to {skip + limit}")
-                    batch_pipeline = pipeline.copy()
-                    batch_pipeline.extend([{"$skip": skip}, {"$limit": limit}])
-                    LOGGER.debug(f"Executing pipeline: {batch_pipeline}")
-                    batch = await self.data_client.tabular_data_by_mql(organization_id=self.org_id, query=batch_pipeline)
-                    batch_len = len(batch)
-                    if batch_len == 0:
-                        break
-                    all_data.extend(batch)
-                    LOGGER.info(f"Retrieved {batch_len} records")
-                    if batch_len < limit:
-                        break
-                    skip += limit
-
-                # Bucket data if needed
+                pipeline = [
+                    {"$match": match_predicate},
+                    {"$sort": {"time_received": 1}},
+                    # Only timestamps and readings are used; leave metadata and ids on the server
+                    # and lift readings to the top level
+                    {"$project": {"_id": 0, "time_received": 1, "readings": "$data.readings"}},
+                ]
                 if bucket_period:
-                    all_data = self._bucket_data(all_data, bucket_period, bucket_method, include_keys_regex)
-
-                # Create Excel workbook
-                wb = Workbook()
-                ws = wb.active
-                ws.title = tab_name
-
-                if all_data:
-                    data_keys = sorted(all_data[0]["data"]["readings"].keys())
-                    headers = ["time_received"] + data_keys
-                    for col_idx, header in enumerate(headers, 1):
-                        ws.cell(row=1, column=col_idx, value=header)
-
-                    for row_idx, row in enumerate(all_data, 2):
-                        time_received = row["time_received"].replace(tzinfo=pytz.utc).astimezone(self.timezone)
-                        ws.cell(row=row_idx, column=1, value=time_received.replace(tzinfo=None))
-                        for col_idx, key in enumerate(data_keys, 2):
-                            try:
-                                if key in row["data"]["readings"]:
-                                    ws.cell(row=row_idx, column=col_idx, value=row["data"]["readings"][key])
-                            except Exception as e:
-                                LOGGER.warning(f"Error writing value for key {key}: {e}")
-
-                wb.save(output_file)
+                    # Fold each page into bucket columns as it arrives so raw rows are not kept.
+                    # Aggregation is CPU-bound; keep it off the event loop.
+                    columns = self._bucket_columns(bucket_period, bucket_method, include_keys_regex)
+                    total = 0
+                    async for batch in self._iter_pages(pipeline):
+                        LOGGER.debug(f"Retrieved {len(batch)} records")
+                        total += len(batch)
+                        await asyncio.to_thread(columns.add, [(row["time_received"], row["readings"]) for row in batch])
+                    LOGGER.info(f"Retrieved {total} records")
+                    all_data = await asyncio.to_thread(self._aggregate_columns, columns, bucket_method)
+                else:
+                    all_data = await self._fetch_all(pipeline)
+
+                await asyncio.to_thread(self._write_workbook, output_file, tab_name, all_data, engine)
                 LOGGER.info(f"Saved workbook to {output_file} with {len(all_data)} rows")
                 return output_file
 
+            except Exception:
+                # The connection may be broken; other exports may still be using it
+                self._client_stale = True
+                raise
             finally:
-                client.close()
+                self._active_exports -= 1
+                if self._client_stale:
+                    # Reconnect on the next export
+                    self.release()
 
         except Exception as e:
             LOGGER.error(f"Failed to export to Excel: {e}")
             return None
 
-    def _floor_timestamp(self, ts: datetime.datetime, bucket_td: datetime.timedelta) -> datetime.datetime:
-        """Round a timestamp down to the nearest bucket interval."""
-        epoch = datetime.datetime(1970, 1, 1, tzinfo=ts.tzinfo)
-        bucket_count = (ts - epoch) // bucket_td
-        return epoch + bucket_count * bucket_td
+    async def _fetch_all(self, pipeline: List[Dict]) -> List[DataPoint]:
+        """Collect every page of a query's results as flat (time_received, readings) records."""
+        all_data = []
+        async for batch in self._iter_pages(pipeline):
+            all_data.extend([(row["time_received"], row["readings"]) for row in batch])
+            LOGGER.debug(f"Retrieved {len(batch)} records")
+        LOGGER.info(f"Retrieved {len(all_data)} records")
+        return all_data
+
+    def _iter_rows(self, data: List[DataPoint]):
+        """Yield the header row and one row per data point with naive local timestamps."""
+        if not data:
+            return
+        data_keys = sorted(data[0][1].keys())
+        yield ["time_received"] + data_keys
+
+        # Convert all timestamps from UTC to naive local time in one vectorized pass
+        local_times = pd.to_datetime([time_received for time_received, _ in data], utc=True) \
+            .tz_convert(self.timezone).tz_localize(None).to_pydatetime()
+        for time_received, (_, readings) in zip(local_times, data):
+            yield [time_received, *[readings.get(key) for key in data_keys]]
+
+    def _write_workbook(self, output_file: str, tab_name: str, data: List[DataPoint], engine: str = "openpyxl"):
+        """Write data points to a single-sheet workbook, streaming rows instead of building a cell grid."""
+        if engine == "csv":
+            self._write_csv(output_file, data)
+            return
+        if engine != "openpyxl":
+            LOGGER.warning(f"Unsupported workbook engine: {engine}, using openpyxl")
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=tab_name)
+        for row in self._iter_rows(data):
+            ws.append(row)
+        wb.save(output_file)
+
+    def _write_csv(self, output_file: str, data: List[DataPoint]):
+        """Write data points as CSV for callers that read the rows back instead of opening a workbook."""
+        with open(output_file, "w", newline="") as f:
+            csv.writer(f).writerows(self._iter_rows(data))
+
+    async def _fetch_page(self, pipeline: List[Dict], skip: int, limit: int, semaphore: asyncio.Semaphore) -> List[Dict]:
+        """Fetch one page of MQL query results."""
+        async with semaphore:
+            LOGGER.debug(f"Retrieving data from {skip} to {skip + limit}")
+            batch_pipeline = pipeline + [{"$skip": skip}, {"$limit": limit}]
+            LOGGER.debug(f"Executing pipeline: {batch_pipeline}")
+            return await self.data_client.tabular_data_by_mql(organization_id=self.org_id, query=batch_pipeline)
+
+    async def _fetch_wave(self, pipeline: List[Dict], skip: int, limit: int, semaphore: asyncio.Semaphore,
+                          backpressure: Backpressure, attempts: int = 3) -> List[List[Dict]]:
+        """Fetch a wave of consecutive pages beginning at `skip`, retrying failed waves.
+
+        The wave size comes from the backpressure controller, which is updated with
+        the outcome and latency of every attempt.
+        """
+        for attempt in range(1, attempts + 1):
+            window = backpressure.window
+            started = time.monotonic()
+            pages = [
+                asyncio.create_task(self._fetch_page(pipeline, skip + i * limit, limit, semaphore))
+                for i in range(window)
+            ]
+            try:
+                batches = await asyncio.gather(*pages)
+            except Exception as e:
+                # gather leaves the other pages running; stop them so they free their slots before the retry
+                for page in pages:
+                    page.cancel()
+                await asyncio.gather(*pages, return_exceptions=True)
+                backpressure.on_error()
+                if attempt == attempts:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = 2 ** attempt
+                LOGGER.warning(f"Fetch from {skip} failed (attempt {attempt}/{attempts}): {e}; retrying in {delay}s")
+                await asyncio.sleep(delay)
+                continue
+            backpressure.on_success(time.monotonic() - started)
+            return batches
+
+    async def _iter_pages(self, pipeline: List[Dict], limit: int = 1000):
+        """Yield non-empty pages of query results in order.
+
+        Pages are requested in waves whose size adapts to how the API responds, and
+        the next wave is prefetched while the current one is consumed. The semaphore
+        keeps the total number of in-flight requests at `concurrency`.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        backpressure = Backpressure(self.concurrency)
+        skip = 0
+        next_wave = asyncio.create_task(self._fetch_wave(pipeline, skip, limit, semaphore, backpressure))
+        try:
+            while next_wave is not None:
+                batches = await next_wave
+                next_wave = None
+                # A short page marks the end of the results; otherwise start the next wave
+                if all(len(batch) == limit for batch in batches):
+                    skip += len(batches) * limit
+                    next_wave = asyncio.create_task(self._fetch_wave(pipeline, skip, limit, semaphore, backpressure))
+                for batch in batches:
+                    if not batch:
+                        break
+                    yield batch
+                    if len(batch) < limit:
+                        break
+        finally:
+            if next_wave is not None:
+                next_wave.cancel()
+                # Wait for the prefetch to unwind so none of its requests outlive the export
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await next_wave
 
-    def _bucket_data(self, data: List[Dict], bucket_period: datetime.timedelta, bucket_method: str, include_keys_regex: Optional[str] = None) -> List[Dict]:
+    def _key_filter(self, pattern: str):
+        """Return a predicate equivalent to `re.match(pattern, key)`, cached per pattern.
+
+        Patterns of the form `.*LITERAL`, `.*LITERAL$`, `LITERAL.*` and `LITERAL`
+        (optionally starting with `^`) are answered with plain string tests
+        instead of the regex engine.
+        """
+        predicate = self._key_filters.get(pattern)
+        if predicate is None:
+            regex = re.compile(pattern)
+            # re.match is already anchored at the start, so a leading ^ changes nothing
+            body = pattern[1:] if pattern.startswith("^") else pattern
+            literal = lambda text: re.escape(text) == text
+            if body.startswith(".*") and body.endswith("$") and literal(body[2:-1]):
+                suffix = body[2:-1]
+                # `.` and `$` treat newlines specially, so only single-line keys can skip the regex
+                predicate = lambda key: key.endswith(suffix) if "\n" not in key else regex.match(key) is not None
+            elif body.startswith(".*") and literal(body[2:]):
+                needle = body[2:]
+                predicate = lambda key: needle in key if "\n" not in key else regex.match(key) is not None
+            elif body.endswith(".*") and literal(body[:-2]):
+                predicate = lambda key, prefix=body[:-2]: key.startswith(prefix)
+            elif literal(body):
+                predicate = lambda key, prefix=body: key.startswith(prefix)
+            else:
+                predicate = lambda key: regex.match(key) is not None
+            self._key_filters[pattern] = predicate
+        return predicate
+
+    def _bucket_data(self, data: List[DataPoint], bucket_period: datetime.timedelta, bucket_method: str, include_keys_regex: Optional[str] = None) -> List[DataPoint]:
         """Bucket data by time period and aggregation method.
 
         Args:
-            data: List of data points
+            data: List of (time_received, readings) data points
             bucket_period: Timedelta object specifying bucket size
             bucket_method: Aggregation method (min, max, avg, first, last, pct95, pct99)
             include_keys_regex: Regex pattern for keys to include
@@ -171,45 +495,98 @@ class DataExporter:
         Returns:
             List of aggregated data points
         """
+        columns = self._bucket_columns(bucket_period, bucket_method, include_keys_regex)
+        columns.add(data)
+        return self._aggregate_columns(columns, bucket_method)
+
+    def _bucket_columns(self, bucket_period: datetime.timedelta, bucket_method: str, include_keys_regex: Optional[str] = None) -> "BucketColumns":
+        """Start an empty set of bucket columns for the given period and key filter."""
         LOGGER.info(f"Bucketing data with period {bucket_period} using method {bucket_method}")
-        include_regex = re.compile(include_keys_regex) if include_keys_regex else None
-        bucketed_data = {}
-
-        for row in data:
-            time_received = row["time_received"]
-            bucket = self._floor_timestamp(time_received, bucket_period)
-            if bucket not in bucketed_data:
-                bucketed_data[bucket] = {}
-            for key, value in row["data"]["readings"].items():
-                if include_regex and not include_regex.match(key):
-                    continue
-                if key not in bucketed_data[bucket]:
-                    bucketed_data[bucket][key] = []
-                bucketed_data[bucket][key].append(value)
-
-        LOGGER.debug(f"Created {len(bucketed_data)} time buckets")
-        aggregated_data = []
-        for bucket, readings in bucketed_data.items():
-            aggregated_reading = {}
-            for key, values in readings.items():
-                if bucket_method == "max":
-                    aggregated_reading[key] = max(values)
-                elif bucket_method == "min":
-                    aggregated_reading[key] = min(values)
-                elif bucket_method == "avg":
-                    aggregated_reading[key] = sum(values) / len(values)
-                elif bucket_method == "first":
-                    aggregated_reading[key] = values[0]
-                elif bucket_method == "last":
-                    aggregated_reading[key] = values[-1]
-                elif bucket_method == "pct95":
-                    aggregated_reading[key] = np.percentile(values, 95)
-                elif bucket_method == "pct99":
-                    aggregated_reading[key] = np.percentile(values, 99)
-                else:
-                    LOGGER.warning(f"Unsupported bucket method: {bucket_method}, using max")
-                    aggregated_reading[key] = max(values)
-            aggregated_data.append({"time_received": bucket, "data": {"readings": aggregated_reading}})
+        include_key = self._key_filter(include_keys_regex) if include_keys_regex else None
+        return BucketColumns(bucket_period, include_key)
+
+    def _aggregate_columns(self, columns: "BucketColumns", bucket_method: str) -> List[DataPoint]:
+        """Aggregate filled bucket columns into one data point per bucket."""
+        if not columns.row_ids:
+            return []
+        row_ids = np.concatenate(columns.row_ids)
+        unique_ids = np.unique(row_ids)
+        # Naive timestamps are UTC
+        tzinfo = columns.tzinfo
+        epoch = datetime.datetime(1970, 1, 1, tzinfo=None if tzinfo is None else UTC)
+        buckets = [epoch + int(bucket_id) * columns.bucket_period for bucket_id in unique_ids.tolist()]
+        if tzinfo is not None and tzinfo is not UTC:
+            buckets = [bucket.astimezone(tzinfo) for bucket in buckets]
+        LOGGER.debug(f"Created {len(buckets)} time buckets")
+
+        # When every bucket holds exactly one row, each aggregate is that row's own value
+        single_rows = len(unique_ids) == len(row_ids)
+        # Rows normally arrive in time order, which leaves every column already grouped by bucket
+        in_order = single_rows or bool(np.all(row_ids[1:] >= row_ids[:-1]))
+
+        # Aggregate every bucket of a key with one NumPy pass instead of a call per bucket
+        aggregated_readings = [{} for _ in buckets]
+        for key, (bucket_ids, values) in columns.columns.items():
+            bucket_ids = np.frombuffer(bucket_ids, dtype=np.int64)
+            values = np.frombuffer(values, dtype=np.float64)
+            if single_rows:
+                present, aggregated = bucket_ids, values
+            else:
+                if not in_order:
+                    # Stable sort keeps arrival order within a bucket for first/last
+                    order = np.argsort(bucket_ids, kind="stable")
+                    bucket_ids, values = bucket_ids[order], values[order]
+                starts = np.flatnonzero(np.diff(bucket_ids, prepend=bucket_ids[0] - 1))
+                present = bucket_ids[starts]
+                aggregated = self._aggregate_segments(values, starts, bucket_method)
+            for bucket_idx, value in zip(np.searchsorted(unique_ids, present).tolist(), aggregated.tolist()):
+                aggregated_readings[bucket_idx][key] = value
+
+        # np.unique returns bucket ids in ascending order, so buckets are already chronological
+        return list(zip(buckets, aggregated_readings))
+
+    def _aggregate_segments(self, values: np.ndarray, starts: np.ndarray, bucket_method: str) -> np.ndarray:
+        """Aggregate contiguous segments of values, each beginning at an index in starts."""
+        if bucket_method == "min":
+            return np.minimum.reduceat(values, starts)
+        if bucket_method == "avg":
+            counts = np.diff(np.append(starts, len(values)))
+            return np.add.reduceat(values, starts) / counts
+        if bucket_method == "first":
+            return values[starts]
+        if bucket_method == "last":
+            return values[np.append(starts[1:], len(values)) - 1]
+        if bucket_method == "pct95":
+            return self._segment_percentiles(values, starts, 95)
+        if bucket_method == "pct99":
+            return self._segment_percentiles(values, starts, 99)
+        if bucket_method != "max":
+            LOGGER.warning(f"Unsupported bucket method: {bucket_method}, using max")
+        return np.maximum.reduceat(values, starts)
 
-        aggregated_data.sort(key=lambda x: x["time_received"])
-        return aggregated_data
\ No newline at end of file
+    def _segment_percentiles(self, values: np.ndarray, starts: np.ndarray, q: float) -> np.ndarray:
+        """Compute the q-th percentile of every segment at once, matching np.percentile's linear method."""
+        counts = np.diff(np.append(starts, len(values)))
+        position = (counts - 1) * (q / 100)
+        below = np.floor(position)
+        gamma = position - below
+        # Offsets of the two order statistics to interpolate between, within each segment
+        lower = below.astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+        if len(values) >= 64 * len(starts):
+            # Large buckets: select just the two neighbours per bucket in linear time
+            a = np.empty(len(starts))
+            b = np.empty(len(starts))
+            for i, (segment, lo, hi) in enumerate(zip(np.split(values, starts[1:]), lower.tolist(), upper.tolist())):
+                selected = np.partition(segment, (lo, hi))
+                a[i], b[i] = selected[lo], selected[hi]
+        else:
+            # Many small buckets: one sort orders the values within every segment
+            segment_ids = np.repeat(np.arange(len(starts)), counts)
+            ordered = values[np.lexsort((values, segment_ids))]
+            a, b = ordered[starts + lower], ordered[starts + upper]
+        diff = b - a
+        # Interpolate from the nearer neighbour, as NumPy does, for identical rounding
+        result = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+        result[np.logical_or.reduceat(np.isnan(values), starts)] = np.nan
+        return result
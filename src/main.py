@@ -3,10 +3,18 @@ from viam.module.module import Module
 from viam.components.sensor import Sensor
 from .report import StockReportEmail
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 async def main():
     module = Module.from_args()
     module.add_model_from_registry(Sensor.API, StockReportEmail.MODEL)
     await module.start()
 
 if __name__ == "__main__":
+    # Prefer uvloop's faster event loop when it is available
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
\ No newline at end of file
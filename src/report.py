@@ -1,13 +1,13 @@
 import asyncio
+import csv
 import datetime
 import json
 import os
 import base64
-import fasteners
-import shutil
+import re
+import time
+import uuid
 import zipfile
-import xml.etree.ElementTree as ET
-import openpyxl
 from typing import Mapping, Optional, Any, Dict, List
 from viam.module.module import Module
 from viam.components.sensor import Sensor
@@ -19,18 +19,98 @@ from viam.utils import SensorReading, struct_to_dict
 from viam.logging import getLogger
 from viam.media.video import ViamImage
 from dateutil import tz
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import (
-    Mail, Attachment, FileContent, FileName,
-    FileType, Disposition, Email, Content
-)
-from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 
-from .export import DataExporter
+from .export import DataExporter, rows_xml
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 
 LOGGER = getLogger(__name__)
 
+# 24-hour "HH:MM"; single-digit hours and minutes are accepted, as strptime did
+_HHMM = re.compile(r"([01]?\d|2[0-3]):([0-5]?\d)")
+
+# Worksheet row start tags and the end of the sheetData block, with or without a namespace prefix
+_ROW_START = re.compile(rb'<(?:\w+:)?row\b[^>]*?\sr="(\d+)"')
+_SHEET_DATA_END = re.compile(rb'</(?:\w+:)?sheetData>|<(?:\w+:)?sheetData\s*/>')
+_DIMENSION = re.compile(rb'<dimension\b[^>]*/>')
+# Rows and cells of the template's Raw Import data, read only for their styles
+_ROW_ELEMENT = re.compile(rb'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_ROW_NUMBER = re.compile(rb'\sr="(\d+)"')
+_ROW_POSITION_ATTRS = re.compile(rb'\s(?:r|spans)="[^"]*"')
+_CELL_ELEMENT = re.compile(rb'<c\b([^>]*?)(?:/>|>.*?</c>)', re.S)
+_CELL_COLUMN = re.compile(rb'\sr="([A-Z]+)\d+"')
+_STYLE_ATTR = re.compile(rb'\ss="(\d+)"')
+
+# Package parts touched when the Raw Import sheet is spliced into the template
+_NUM_FMT_ID = re.compile(rb'<numFmt\b[^>]*?\snumFmtId="(\d+)"')
+_STYLESHEET_START = re.compile(rb'<styleSheet\b[^>]*>')
+_COUNT_ATTR = re.compile(rb'\scount="\d+"')
+_CALC_PR_ANCHOR = re.compile(rb'</(?:definedNames|externalReferences|functionGroups|sheets)>')
+_CALC_CHAIN_REL = re.compile(rb'<Relationship\b[^>]*?/calcChain"[^>]*/>')
+_CALC_CHAIN_OVERRIDE = re.compile(rb'<Override\b[^>]*?PartName="/xl/calcChain\.xml"[^>]*/>')
+_CALC_CHAIN_PATH = "xl/calcChain.xml"
+_WORKSHEET_PATH = re.compile(r"xl/worksheets/[^/]+\.xml")
+# A formula cell's cached result, which follows its <f> element; formula text never contains "<"
+_FORMULA_CACHED_VALUE = re.compile(rb'(<(?:\w+:)?f\b(?:[^>]*/>|[^>]*>[^<]*</(?:\w+:)?f>))\s*<(?:\w+:)?v\s*(?:/>|>[^<]*</(?:\w+:)?v>)')
+# Same display format openpyxl gives datetime cells
+_DATE_FORMAT = "yyyy-mm-dd h:mm:ss"
+
+
+def _parse_raw_value(value: str):
+    """Convert a raw export CSV field back to the value the exporter wrote."""
+    if value == "":
+        return None
+    if value in ("True", "False"):
+        return value == "True"
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _parse_raw_row(row: List[str]) -> list:
+    """Convert a raw export CSV row: an ISO timestamp followed by reading values."""
+    if not row:
+        return row
+    return [datetime.datetime.fromisoformat(row[0]), *map(_parse_raw_value, row[1:])]
+
+
+def _zip_info(item: zipfile.ZipInfo, compress_type: int) -> zipfile.ZipInfo:
+    """Copy a zip entry's name, timestamp and attributes with the given compression method."""
+    info = zipfile.ZipInfo(item.filename, item.date_time)
+    info.external_attr = item.external_attr
+    info.compress_type = compress_type
+    return info
+
+
+def _column_number(letters: str) -> int:
+    """Return the 1-based number of a column from its letters."""
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+
+def _parse_hhmm(value) -> datetime.time:
+    """Parse an 'HH:MM' string into a time object."""
+    match = _HHMM.fullmatch(str(value))
+    if not match:
+        raise ValueError(f"Invalid time '{value}': must be in 'HH:MM' format")
+    return datetime.time(int(match.group(1)), int(match.group(2)))
+
 class StockReportEmail(Sensor):
     MODEL = Model(ModelFamily("hunter", "stock-report"), "report-email-sensor")
     
@@ -56,26 +136,20 @@ class StockReportEmail(Sensor):
 
         # Validate send_time
         send_time = attributes.get("send_time", "20:00")
-        try:
-            datetime.datetime.strptime(str(send_time), "%H:%M")
-        except ValueError:
+        if not _HHMM.fullmatch(str(send_time)):
             raise ValueError(f"Invalid send_time '{send_time}': must be in 'HH:MM' format")
 
         # Validate process_time if provided
         process_time = attributes.get("process_time")
         if process_time:
-            try:
-                datetime.datetime.strptime(str(process_time), "%H:%M")
-            except ValueError:
+            if not _HHMM.fullmatch(str(process_time)):
                 raise ValueError(f"Invalid process_time '{process_time}': must be in 'HH:MM' format")
 
-        # Validate capture_times if provided
-        if "capture_times" in attributes:
-            for time_str in attributes["capture_times"]:
-                try:
-                    datetime.datetime.strptime(time_str, "%H:%M")
-                except ValueError:
-                    raise ValueError(f"Invalid capture_times entry '{time_str}': must be in 'HH:MM' format")
+        # Validate capture times if provided
+        for times_key in ["capture_times_weekday", "capture_times_weekend"]:
+            for time_str in attributes.get(times_key, []):
+                if not _HHMM.fullmatch(str(time_str)):
+                    raise ValueError(f"Invalid {times_key} entry '{time_str}': must be in 'HH:MM' format")
         
         # Validate store hours
         for hours_key in ["hours_weekdays", "hours_weekends"]:
@@ -87,9 +161,7 @@ class StockReportEmail(Sensor):
 
             # Validate each time string
             for time_str in hours:
-                try:
-                    datetime.datetime.strptime(str(time_str), "%H:%M")
-                except ValueError:
+                if not _HHMM.fullmatch(str(time_str)):
                     raise ValueError(f"Invalid time format in '{hours_key}': '{time_str}' - must be in 'HH:MM' format")
 
         # Check SendGrid API key
@@ -119,18 +191,11 @@ class StockReportEmail(Sensor):
             raise ValueError("camera_name must be specified when include_images is true")
 
         # Return required dependencies
-        # TODO: Standardize code...
         deps = []
 
-        # Add camera dependency if configured
+        # Add camera dependency if configured (remote names are used as-is)
         if include_images and attributes.get("camera_name"):
-            camera_name = attributes.get("camera_name")
-            # If camera_name includes a remote name, use it directly
-            if ":" in camera_name:
-                deps.append(camera_name)
-            else:
-                # No remote prefix needed now
-                deps.append(camera_name)
+            deps.append(attributes.get("camera_name"))
 
         LOGGER.info(f"StockReportEmail.validate_config completed for {deps}")
         return deps
@@ -147,17 +212,19 @@ class StockReportEmail(Sensor):
         self.sendgrid_api_key = ""
         self.sender_email = "no-reply@viam.com"
         self.sender_name = "Stock Report Module"
+        self._sendgrid_client = None
+        self._prepare_email_templates()
+        self._exporter = None
 
         # Camera configuration
         self.camera_name = ""
         self.include_images = False
         self.image_width = 640
         self.image_height = 480
-        # Remove single capture times
-        # self.capture_times = ["08:00", "10:00", "12:00", "14:00", "16:00", "18:00"]
         self.capture_times_weekday = ["07:00", "08:00", "10:00", "12:00", "14:00", "16:00", "18:00"]
         self.capture_times_weekend = ["08:00", "09:00", "11:00", "16:00"]
-        self.last_capture_time = None
+        self._capture_time_objs_weekday = self._parse_times(self.capture_times_weekday)
+        self._capture_time_objs_weekend = self._parse_times(self.capture_times_weekend)
 
         # API configuration
         # Viam Data Client
@@ -168,11 +235,16 @@ class StockReportEmail(Sensor):
         # Store hours defaults
         self.hours_weekdays = ["07:00", "19:30"]  # Default for weekdays (Mon-Fri)
         self.hours_weekends = ["08:00", "17:00"]  # Default for weekends (Sat-Sun)
+        self._hours_weekdays_obj = (datetime.time(7, 0), datetime.time(19, 30))
+        self._hours_weekends_obj = (datetime.time(8, 0), datetime.time(17, 0))
         self.timezone = "America/New_York"
+        self._tzinfo = tz.gettz(self.timezone)
 
         # Simplified scheduling
         self.process_time = "20:00"
         self.send_time = "20:30"
+        self._process_time_obj = datetime.time(20, 0)
+        self._send_time_obj = datetime.time(20, 30)
         
         # State
         self.last_processed_time = None
@@ -180,66 +252,151 @@ class StockReportEmail(Sensor):
         self.last_capture_time = None
         self.last_workbook_path = None
         self.total_reports_sent = 0
+        self.last_sent_slot_ts = None
         self.report_status = "not_sent"
         self.workbook_status = "not_processed"
 
         # State persistence
         self.state_dir = os.path.join(os.path.expanduser("~"), ".stock-report")
         self.state_file = os.path.join(self.state_dir, f"{name}.json")
+        self.lock_file = f"{self.state_file}.lock"
         self.workbooks_dir = os.path.join(self.state_dir, "workbooks")
         self.images_dir = os.path.join(self.state_dir, "images")
         os.makedirs(self.state_dir, exist_ok=True)
         os.makedirs(self.workbooks_dir, exist_ok=True)
         os.makedirs(self.images_dir, exist_ok=True)
 
+        # Readings cache
+        self._readings_cache = None
+        self._readings_cache_slot = None
+
+        # Sheet mappings and prepared template parts keyed by workbook path, valid while the file is unchanged
+        self._sheet_mappings_cache = {}
+        self._template_parts_cache = {}
+
         # Background tasks
+        self._start_task = None
         self._process_task = None
         self._send_task = None
         self._capture_task = None
 
         # Load state silently
         self._load_state()
+        self._remove_stale_raw_exports()
     
     def _load_state(self):
         """Load persistent state from file with locking."""
-        if os.path.exists(self.state_file):
-            lock = fasteners.InterProcessLock(f"{self.state_file}.lock")
-            try:
-                if lock.acquire(blocking=True, timeout=5):
-                    try:
-                        with open(self.state_file, "r") as f:
-                            state = json.load(f)
-                            self.last_processed_time = (
-                                datetime.datetime.fromisoformat(state["last_processed_time"])
-                                if state.get("last_processed_time") else None
-                            )
-                            self.last_sent_time = (
-                                datetime.datetime.fromisoformat(state["last_sent_time"])
-                                if state.get("last_sent_time") else None
-                            )
-                            self.last_capture_time = (
-                                datetime.datetime.fromisoformat(state["last_capture_time"])
-                                if state.get("last_capture_time") else None
-                            )
-                            self.last_workbook_path = state.get("last_workbook_path")
-                            self.total_reports_sent = state.get("total_reports_sent", 0)
-                            self.report_status = state.get("report_status", "not_sent")
-                            self.workbook_status = state.get("workbook_status", "not_processed")
-                        LOGGER.info(f"Loaded state from {self.state_file}")
-                    finally:
-                        lock.release()
-                else:
-                    LOGGER.warning(f"Could not acquire lock to load state for {self.name}")
-            except Exception as e:
-                LOGGER.error(f"Error loading state: {e}")
-        else:
+        # Fall back to a leftover temp file if the main file is missing or corrupt
+        candidates = [path for path in (self.state_file, f"{self.state_file}.tmp") if os.path.exists(path)]
+        if not candidates:
             LOGGER.info(f"No state file at {self.state_file}, starting fresh")
+            return
+
+        try:
+            if self._acquire_state_lock(timeout=5):
+                try:
+                    state, state_path = None, None
+                    for path in candidates:
+                        try:
+                            with open(path, "rb") as f:
+                                data = f.read()
+                            loaded = orjson.loads(data) if orjson else json.loads(data)
+                        except ValueError as e:
+                            LOGGER.warning(f"Ignoring corrupt state file {path}: {e}")
+                            continue
+                        if not isinstance(loaded, dict):
+                            LOGGER.warning(f"Ignoring state file {path}: expected an object, got {type(loaded).__name__}")
+                            continue
+                        state, state_path = loaded, path
+                        break
+                    if state is None:
+                        LOGGER.warning(f"No readable state for {self.name}, starting fresh")
+                        return
+
+                    self.last_processed_time = (
+                        datetime.datetime.fromisoformat(state["last_processed_time"])
+                        if state.get("last_processed_time") else None
+                    )
+                    self.last_sent_time = (
+                        datetime.datetime.fromisoformat(state["last_sent_time"])
+                        if state.get("last_sent_time") else None
+                    )
+                    self.last_capture_time = (
+                        datetime.datetime.fromisoformat(state["last_capture_time"])
+                        if state.get("last_capture_time") else None
+                    )
+                    self.last_workbook_path = state.get("last_workbook_path")
+                    self.total_reports_sent = state.get("total_reports_sent", 0)
+                    self.last_sent_slot_ts = state.get("last_sent_slot_ts")
+                    self.report_status = state.get("report_status", "not_sent")
+                    self.workbook_status = state.get("workbook_status", "not_processed")
+                    LOGGER.info(f"Loaded state from {state_path}")
+                finally:
+                    self._release_state_lock()
+            else:
+                LOGGER.warning(f"Could not acquire lock to load state for {self.name}")
+        except Exception as e:
+            LOGGER.error(f"Error loading state: {e}")
     
+    def _acquire_state_lock(self, timeout: float = 5) -> bool:
+        """Create the state lock file exclusively, clearing it if its owner has died."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+                try:
+                    os.write(fd, str(os.getpid()).encode())
+                finally:
+                    os.close(fd)
+                return True
+            except FileExistsError:
+                if self._state_lock_is_stale():
+                    LOGGER.warning(f"Removing stale state lock {self.lock_file}")
+                    try:
+                        os.unlink(self.lock_file)
+                    except FileNotFoundError:
+                        pass
+                    continue
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def _release_state_lock(self):
+        """Remove the state lock file."""
+        try:
+            os.unlink(self.lock_file)
+        except FileNotFoundError:
+            pass
+
+    def _state_lock_is_stale(self) -> bool:
+        """Check whether the process that wrote the lock file is gone."""
+        try:
+            with open(self.lock_file, "r") as f:
+                pid = int(f.read().strip())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            # Empty or unreadable (e.g. left over from the old fasteners lock);
+            # only treat it as stale once its owner has had time to write a PID
+            try:
+                return time.time() - os.path.getmtime(self.lock_file) > 5
+            except OSError:
+                return False
+        # The lock is never held across awaits, so our own PID means a previous run
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
     def _save_state(self):
         """Save state to file for persistence across restarts using file locking."""
-        lock = fasteners.InterProcessLock(f"{self.state_file}.lock")
         try:
-            if lock.acquire(blocking=True, timeout=5):
+            if self._acquire_state_lock(timeout=5):
                 try:
                     state = {
                         "last_processed_time": self.last_processed_time.isoformat() if self.last_processed_time else None,
@@ -247,16 +404,26 @@ class StockReportEmail(Sensor):
                         "last_capture_time": self.last_capture_time.isoformat() if self.last_capture_time else None,
                         "last_workbook_path": self.last_workbook_path,
                         "total_reports_sent": self.total_reports_sent,
+                        "last_sent_slot_ts": self.last_sent_slot_ts,
                         "report_status": self.report_status,
                         "workbook_status": self.workbook_status
                     }
                     temp_file = f"{self.state_file}.tmp"
-                    with open(temp_file, "w") as f:
-                        json.dump(state, f)
+                    payload = orjson.dumps(state) if orjson else json.dumps(state).encode()
+                    with open(temp_file, "wb") as f:
+                        f.write(payload)
+                        f.flush()
+                        os.fsync(f.fileno())
                     os.replace(temp_file, self.state_file)
+                    # Make the rename itself durable
+                    dir_fd = os.open(self.state_dir, os.O_RDONLY)
+                    try:
+                        os.fsync(dir_fd)
+                    finally:
+                        os.close(dir_fd)
                     LOGGER.debug(f"Saved state to {self.state_file}")
                 finally:
-                    lock.release()
+                    self._release_state_lock()
             else:
                 LOGGER.warning(f"Could not acquire lock to save state for {self.name}")
         except Exception as e:
@@ -276,7 +443,9 @@ class StockReportEmail(Sensor):
         self.sender_email = attributes.get("sender_email", "no-reply@viam.com")
         self.sender_name = attributes.get("sender_name", "Stock Report Module")
         self.sendgrid_api_key = attributes.get("sendgrid_api_key", "")
+        self._sendgrid_client = None
         self.teleop_url = attributes.get("teleop_url", "")
+        self._prepare_email_templates()
 
         # API configuration
         self.api_key_id = attributes.get("api_key_id", "")
@@ -294,6 +463,8 @@ class StockReportEmail(Sensor):
         # Store hours
         self.hours_weekdays = attributes.get("hours_weekdays", ["07:00", "19:30"])
         self.hours_weekends = attributes.get("hours_weekends", ["08:00", "17:00"])
+        self._hours_weekdays_obj = tuple(_parse_hhmm(t) for t in self.hours_weekdays)
+        self._hours_weekends_obj = tuple(_parse_hhmm(t) for t in self.hours_weekends)
 
         # Scheduling configuration
         self.send_time = attributes.get("send_time", "20:00")
@@ -301,30 +472,31 @@ class StockReportEmail(Sensor):
         self.process_time = attributes.get("process_time", self.send_time)  
         # If still unset, calculate 1 hour before send_time
         if not self.process_time:  
-            send_dt = datetime.datetime.strptime(self.send_time, "%H:%M")
+            send_dt = datetime.datetime.combine(datetime.date(1900, 1, 1), _parse_hhmm(self.send_time))
             process_dt = send_dt - datetime.timedelta(hours=1)
             self.process_time = process_dt.strftime("%H:%M")
+        self._process_time_obj = _parse_hhmm(self.process_time)
+        self._send_time_obj = _parse_hhmm(self.send_time)
         self.timezone = attributes.get("timezone", "America/New_York")
-        # self.capture_times = attributes.get("capture_times", ["08:00", "10:00", "12:00", "14:00", "16:00", "18:00"])
-        # New schedule configuration
+        self._tzinfo = tz.gettz(self.timezone)
+        # Credentials or timezone may have changed; the next export reconnects
+        self._close_exporter()
+        # Capture schedule configuration
         self.capture_times_weekday = attributes.get("capture_times_weekday", ["07:00", "08:00", "10:00", "12:00", "14:00", "16:00", "18:00"])
         self.capture_times_weekend = attributes.get("capture_times_weekend", ["08:00", "09:00", "11:00", "16:00"])
         
         # Sort the capture times to ensure they're in chronological order
-        # self.capture_times = sorted(list(set(self.capture_times)))
         self.capture_times_weekday = sorted(list(set(self.capture_times_weekday)))
         self.capture_times_weekend = sorted(list(set(self.capture_times_weekend)))
+        self._capture_time_objs_weekday = self._parse_times(self.capture_times_weekday)
+        self._capture_time_objs_weekend = self._parse_times(self.capture_times_weekend)
 
         # Store dependencies
         self.dependencies = dependencies
+        self._readings_cache = None
 
         # Cancel existing tasks if they exist
-        if self._process_task and not self._process_task.done():
-            self._process_task.cancel()
-        if self._send_task and not self._send_task.done():
-            self._send_task.cancel()
-        if self._capture_task and not self._capture_task.done():
-            self._capture_task.cancel()
+        stopping_tasks = self._cancel_tasks()
 
         # Log configuration details
         LOGGER.info(f"Configured {self.name} for location '{self.location}'")
@@ -337,13 +509,30 @@ class StockReportEmail(Sensor):
         # Update logging
         if self.include_images:
             LOGGER.info(f"Will capture images from camera: {self.camera_name}")
-            # LOGGER.info(f"Capture times: {', '.join(self.capture_times)}")
             LOGGER.info(f"Weekday capture times: {', '.join(self.capture_times_weekday)}")
             LOGGER.info(f"Weekend capture times: {', '.join(self.capture_times_weekend)}")
         else:
             LOGGER.info("Image capture disabled")
 
-        # Start background tasks
+        # Start background tasks once the cancelled ones have finished unwinding,
+        # so an old loop can't still be mid-run (e.g. writing a workbook) alongside a new one
+        self._start_task = asyncio.create_task(self._start_tasks(stopping_tasks))
+
+    def _cancel_tasks(self) -> List[asyncio.Task]:
+        """Cancel the background tasks and return the ones still running."""
+        tasks = [
+            task for task in (self._start_task, self._process_task, self._send_task, self._capture_task)
+            if task and not task.done()
+        ]
+        for task in tasks:
+            task.cancel()
+        self._start_task = self._process_task = self._send_task = self._capture_task = None
+        return tasks
+
+    async def _start_tasks(self, stopping_tasks: List[asyncio.Task]):
+        """Wait for cancelled tasks to finish, then start the background loops."""
+        if stopping_tasks:
+            await asyncio.gather(*stopping_tasks, return_exceptions=True)
         self._process_task = asyncio.create_task(self._run_process())
         self._send_task = asyncio.create_task(self._run_send())
         if self.include_images:
@@ -351,144 +540,98 @@ class StockReportEmail(Sensor):
     
     async def _run_process(self):
         """Run the workbook processing loop."""
-        LOGGER.info(f"Starting process loop for {self.name} (PID: {os.getpid()})")
-        try:
-            while True:
-                current_time = datetime.datetime.now()
-                next_process = self._get_next_process_time(current_time)
-                sleep_seconds = (next_process - current_time).total_seconds()
-
-                if sleep_seconds <= 0:
-                    LOGGER.info(f"Already past process time {next_process.strftime('%H:%M')}, processing now")
-                    await self.process_workbook()
-                    await asyncio.sleep(1)  # Small gap between checks
-                    continue
-
-                LOGGER.info(f"Next process scheduled for {next_process.strftime('%H:%M')} (sleeping {sleep_seconds:.1f} seconds)")
-                await asyncio.sleep(sleep_seconds)
-                await self.process_workbook()
-
-        except asyncio.CancelledError:
-            LOGGER.info(f"Process loop cancelled for {self.name}")
-            raise
-        except Exception as e:
-            LOGGER.error(f"Error in process loop: {e}")
-            await asyncio.sleep(60)  # Wait before restarting
+        await self._run_schedule("process", self._get_next_process_time, lambda slot: self.process_workbook())
 
     async def _run_send(self):
         """Run the report sending loop."""
-        LOGGER.info(f"Starting send loop for {self.name} (PID: {os.getpid()})")
-        try:
-            while True:
-                current_time = datetime.datetime.now()
-                next_send = self._get_next_send_time(current_time)
-                sleep_seconds = (next_send - current_time).total_seconds()
-
-                if sleep_seconds <= 0:
-                    LOGGER.info(f"Already past send time {next_send.strftime('%H:%M')}, sending now")
-                    await self.send_report_if_ready()
-                    await asyncio.sleep(1)
-                    continue
+        await self._run_schedule("send", self._get_next_send_time, self._send_scheduled_report)
 
-                LOGGER.info(f"Next send scheduled for {next_send.strftime('%H:%M')} (sleeping {sleep_seconds:.1f} seconds)")
-                await asyncio.sleep(sleep_seconds)
-                await self.send_report_if_ready()
-
-        except asyncio.CancelledError:
-            LOGGER.info(f"Send loop cancelled for {self.name}")
-            raise
-        except Exception as e:
-            LOGGER.error(f"Error in send loop: {e}")
-            await asyncio.sleep(60)
-    
     async def _run_capture(self):
         """Run the image capture loop."""
-        LOGGER.info(f"Starting capture loop for {self.name} (PID: {os.getpid()})")
-        try:
-            while True:
+        await self._run_schedule("capture", self._get_next_capture_time, lambda slot: self.capture_image())
+
+    async def _run_schedule(self, label, get_next_time, action):
+        """Sleep until each scheduled time and run the action once per slot."""
+        LOGGER.info(f"Starting {label} loop for {self.name} (PID: {os.getpid()})")
+        last_run = None
+        while True:
+            try:
                 current_time = datetime.datetime.now()
-                next_capture = self._get_next_capture_time(current_time)
-                sleep_seconds = (next_capture - current_time).total_seconds()
+                # Timers can fire marginally early; never pick the slot that just ran again
+                if last_run is not None and current_time <= last_run:
+                    current_time = last_run + datetime.timedelta(seconds=1)
+                next_run = get_next_time(current_time)
+                # Epoch arithmetic stays correct across DST changes, unlike naive datetime subtraction
+                sleep_seconds = next_run.timestamp() - time.time()
+
+                if sleep_seconds > 0:
+                    LOGGER.info(f"Next {label} scheduled for {next_run.strftime('%H:%M')} (sleeping {sleep_seconds:.1f} seconds)")
+                    await asyncio.sleep(sleep_seconds)
+                else:
+                    LOGGER.info(f"Already past {label} time {next_run.strftime('%H:%M')}, running now")
 
-                if sleep_seconds <= 0:
-                    LOGGER.info(f"Already past capture time {next_capture.strftime('%H:%M')}, capturing now")
-                    await self.capture_image()
-                    await asyncio.sleep(1)
-                    continue
+                await action(next_run)
+                last_run = next_run
 
-                LOGGER.info(f"Next capture scheduled for {next_capture.strftime('%H:%M')} (sleeping {sleep_seconds:.1f} seconds)")
-                await asyncio.sleep(sleep_seconds)
-                await self.capture_image()
+            except asyncio.CancelledError:
+                LOGGER.info(f"{label.capitalize()} loop cancelled for {self.name}")
+                raise
+            except Exception as e:
+                LOGGER.error(f"Error in {label} loop: {e}")
+                await asyncio.sleep(60)  # Wait before retrying
 
-        except asyncio.CancelledError:
-            LOGGER.info(f"Capture loop cancelled for {self.name}")
-            raise
-        except Exception as e:
-            LOGGER.error(f"Error in capture loop: {e}")
-            await asyncio.sleep(60)
+    @staticmethod
+    def _parse_times(times: List[str]) -> List[datetime.time]:
+        """Parse a list of 'HH:MM' strings into time objects."""
+        return [_parse_hhmm(t) for t in times]
+
+    @staticmethod
+    def _next_occurrence(current_time: datetime.datetime, time_obj: datetime.time) -> datetime.datetime:
+        """Return the next datetime at or after current_time that falls on time_obj."""
+        dt = datetime.datetime.combine(current_time.date(), time_obj)
+        return dt if current_time <= dt else dt + datetime.timedelta(days=1)
 
     def _get_next_process_time(self, current_time: datetime.datetime) -> datetime.datetime:
         """Calculate the next process time."""
-        today = current_time.date()
-        process_dt = datetime.datetime.combine(today, datetime.time(*map(int, self.process_time.split(":"))))
-        if current_time > process_dt:
-            process_dt += datetime.timedelta(days=1)
-        return process_dt
+        return self._next_occurrence(current_time, self._process_time_obj)
 
     def _get_next_send_time(self, current_time: datetime.datetime) -> datetime.datetime:
         """Calculate the next send time."""
-        today = current_time.date()
-        send_dt = datetime.datetime.combine(today, datetime.time(*map(int, self.send_time.split(":"))))
-        if current_time > send_dt:
-            send_dt += datetime.timedelta(days=1)
-        return send_dt
+        return self._next_occurrence(current_time, self._send_time_obj)
 
     def _get_next_capture_time(self, current_time: datetime.datetime) -> datetime.datetime:
         """Calculate the next capture time (based on weekday and weekend configuration)."""
         today = current_time.date()
         tomorrow = today + datetime.timedelta(days=1)
-        
-        # Determine if today and tomorrow are weekdays
-        is_today_weekday = self._is_weekday(today)
-        is_tomorrow_weekday = self._is_weekday(tomorrow)
-        
-        # Get the appropriate capture times for today and tomorrow
-        today_capture_times = self.capture_times_weekday if is_today_weekday else self.capture_times_weekend
-        tomorrow_capture_times = self.capture_times_weekday if is_tomorrow_weekday else self.capture_times_weekend
-        
-        # Create datetime objects for today's and tomorrow's capture times
-        capture_times_today = [
-            datetime.datetime.combine(today, datetime.time(*map(int, t.split(":"))))
-            for t in today_capture_times
-        ]
-        capture_times_tomorrow = [
-            datetime.datetime.combine(tomorrow, datetime.time(*map(int, t.split(":"))))
-            for t in tomorrow_capture_times
-        ]
-        
+
         # Find all future capture times from today and tomorrow
-        future_captures = [dt for dt in capture_times_today + capture_times_tomorrow if dt > current_time]
-        
+        future_captures = [
+            dt
+            for day in (today, tomorrow)
+            for dt in (datetime.datetime.combine(day, t) for t in self._get_capture_times_for(day))
+            if dt > current_time
+        ]
+
         # If we have future captures, return the earliest one
         if future_captures:
             return min(future_captures)
-        
+
         # If no captures today or tomorrow, find the next day
         day_after_tomorrow = tomorrow + datetime.timedelta(days=1)
-        is_day_after_tomorrow_weekday = self._is_weekday(day_after_tomorrow)
-        next_day_times = self.capture_times_weekday if is_day_after_tomorrow_weekday else self.capture_times_weekend
-        
+        next_day_times = self._get_capture_times_for(day_after_tomorrow)
         if next_day_times:
-            return datetime.datetime.combine(
-                day_after_tomorrow, datetime.time(*map(int, next_day_times[0].split(":")))
-            )
-        
+            return datetime.datetime.combine(day_after_tomorrow, next_day_times[0])
+
         # Fallback (shouldn't happen with our defaults)
         return datetime.datetime.combine(
             # Noon the day after tomorrow
             day_after_tomorrow, datetime.time(12, 0)  
         )
 
+    def _get_capture_times_for(self, date: datetime.date) -> List[datetime.time]:
+        """Get the parsed capture times that apply to the given date."""
+        return self._capture_time_objs_weekday if self._is_weekday(date) else self._capture_time_objs_weekend
+
     async def capture_image(self):
         """Capture an image from the camera and save it to disk."""
         if not self.include_images or not self.camera_name:
@@ -511,11 +654,13 @@ class StockReportEmail(Sensor):
             now = datetime.datetime.now()
             timestamp = now.strftime("%Y%m%d_%H%M%S")
             filename = f"{timestamp}_{self.name}.jpg"
-            daily_dir = os.path.join(self.images_dir, now.strftime("%Y%m%d"))
+            # The day directory is the date part of the timestamp
+            daily_dir = os.path.join(self.images_dir, timestamp[:8])
             os.makedirs(daily_dir, exist_ok=True)
             image_path = os.path.join(daily_dir, filename)
 
             if isinstance(image, ViamImage):
+                from PIL import Image
                 pil_image = Image.open(BytesIO(image.data))
                 pil_image.save(image_path, "JPEG")
             elif isinstance(image, bytes):
@@ -537,6 +682,7 @@ class StockReportEmail(Sensor):
     def annotate_image(self, image_path, font_size=20):
         """Annotate an image with timestamp and location information."""
         try:
+            from PIL import Image, ImageDraw, ImageFont
             img = Image.open(image_path)
             draw = ImageDraw.Draw(img)
             filename = os.path.basename(image_path)
@@ -564,216 +710,441 @@ class StockReportEmail(Sensor):
             LOGGER.error(f"Error annotating image: {e}")
             return image_path
 
-    async def process_workbook(self):
-        """Process the Excel workbook for today's data."""
+    def _remove_stale_raw_exports(self):
+        """Remove raw exports left behind by a run that was killed before its cleanup."""
+        pattern = re.compile(rf"\d{{8}}_{re.escape(self.name)}_raw_export_[0-9a-f]{{32}}\.csv")
+        for scratch_dir in ("/dev/shm", self.workbooks_dir):
+            try:
+                names = os.listdir(scratch_dir)
+            except OSError:
+                continue
+            for filename in names:
+                if pattern.fullmatch(filename):
+                    try:
+                        os.remove(os.path.join(scratch_dir, filename))
+                        LOGGER.info(f"Removed stale raw export: {filename}")
+                    except OSError as e:
+                        LOGGER.warning(f"Failed to remove stale raw export {filename}: {e}")
+
+    async def process_workbook(self, persist: bool = True, day: Optional[datetime.date] = None):
+        """Process the Excel workbook for a day's data.
+
+        Args:
+            persist: Save state when done; callers that save afterwards can skip it
+            day: Day to process; defaults to today. Only today's run becomes the workbook sent
+                and updates workbook_status.
+
+        Returns:
+            The path of the final workbook, or None if processing failed
+        """
         now = datetime.datetime.now()
-        date_str = now.strftime("%Y%m%d")
+        run_date = now if day is None else datetime.datetime.combine(day, datetime.time())
+        date_str = run_date.strftime("%Y%m%d")
+        # Only today's run reports its status, so concurrent backfills cannot overwrite it
+        is_today = run_date.date() == now.date()
+        # The raw export is read back once and discarded, so keep it in RAM-backed storage when available.
+        # Each run gets its own file so several days can be processed at once.
+        scratch_dir = "/dev/shm" if os.access("/dev/shm", os.W_OK) else self.workbooks_dir
+        raw_data_path = os.path.join(scratch_dir, f"{date_str}_{self.name}_raw_export_{uuid.uuid4().hex}.csv")
+        wip_path = os.path.join(self.workbooks_dir, f"{date_str}_{self.name}_wip.xlsx")
         try:
-            target_date = now.replace(tzinfo=tz.gettz(self.timezone))
+            target_date = run_date.replace(tzinfo=self._tzinfo)
             LOGGER.info(f"Processing workbook for date: {date_str}")
 
             template_path = os.path.join(self.workbooks_dir, "template.xlsx")
-            raw_data_path = os.path.join(self.workbooks_dir, "raw_export.xlsx")
             if not os.path.exists(template_path):
                 LOGGER.error(f"Template file not found: {template_path}")
-                self.workbook_status = "error: missing template"
-                self._save_state()
-                return
+                if is_today:
+                    self.workbook_status = "error: missing template"
+                if persist:
+                    self._save_state()
+                return None
 
             opening_time, closing_time = self._get_store_hours_for_date(target_date)
-            open_hour, open_minute = map(int, opening_time.split(':'))
-            close_hour, close_minute = map(int, closing_time.split(':'))
-            start_time = target_date.replace(hour=open_hour, minute=open_minute, second=0, microsecond=0)
-            end_time = target_date.replace(hour=close_hour, minute=close_minute, second=0, microsecond=0)
-
-            LOGGER.info(f"Exporting data from {start_time} to {end_time}")
-            exporter = DataExporter(self.api_key_id, self.api_key, self.org_id, self.location, self.timezone)
-            await exporter.export_to_excel(
-                raw_data_path, "langer_fill", start_time, end_time,
-                bucket_period="PT5M", bucket_method="pct99", include_keys_regex=".*_raw", tab_name="RAW"
-            )
+            start_time = target_date.replace(hour=opening_time.hour, minute=opening_time.minute, second=0, microsecond=0)
+            end_time = target_date.replace(hour=closing_time.hour, minute=closing_time.minute, second=0, microsecond=0)
 
-            wip_filename = f"{date_str}_{self.name}_wip.xlsx"
             final_filename = f"{date_str}_{self.name}.xlsx"
-            wip_path = os.path.join(self.workbooks_dir, wip_filename)
             final_path = os.path.join(self.workbooks_dir, final_filename)
 
-            shutil.copy(template_path, wip_path)
-            num_data_rows = self._update_raw_import_sheet(raw_data_path, wip_path)
-            LOGGER.info(f"Updated Raw Import sheet with {num_data_rows} rows")
-            self._fix_workbook(wip_path, num_data_rows, final_path)
-            LOGGER.info(f"Created final workbook: {final_path}")
-
-            if os.path.exists(wip_path):
-                os.remove(wip_path)
-                LOGGER.info(f"Removed temporary WIP file: {wip_path}")
-
-            self.last_workbook_path = final_path
-            self.last_processed_time = now
-            self.workbook_status = "processed"
-            self._save_state()
+            # Template parsing does not depend on the export, so it runs while the export waits on the API.
+            # Both are awaited before any failure is raised so the export never outlives the cleanup below.
+            LOGGER.info(f"Exporting data from {start_time} to {end_time}")
+            results = await asyncio.gather(
+                self._get_exporter().export_to_excel(
+                    raw_data_path, "langer_fill", start_time, end_time,
+                    bucket_period="PT5M", bucket_method="pct99", engine="csv"
+                ),
+                asyncio.to_thread(self._get_template_parts, template_path),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            # The exporter logs its own failures and returns None instead of raising
+            if results[0] is None:
+                raise RuntimeError("raw data export failed")
+
+            # Workbook generation is CPU and disk bound; keep it off the event loop
+            await asyncio.to_thread(self._build_workbook, template_path, raw_data_path, wip_path, final_path)
+
+            if is_today:
+                self.last_workbook_path = final_path
+                self.last_processed_time = now
+                self.workbook_status = "processed"
+            if persist:
+                self._save_state()
+            return final_path
 
         except Exception as e:
-            LOGGER.error(f"Failed to process workbook: {e}")
-            self.workbook_status = f"error: {str(e)}"
-            self._save_state()
+            LOGGER.error(f"Failed to process workbook for {date_str}: {e}")
+            if is_today:
+                self.workbook_status = f"error: {str(e)}"
+            if persist:
+                self._save_state()
+            return None
+
+        finally:
+            # The WIP file is already gone after a successful build; a failed one may leave it half-written
+            for path in (raw_data_path, wip_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    async def process_workbooks(self, days: List[datetime.date], max_concurrency: int = 4) -> List[Optional[str]]:
+        """Process workbooks for several days concurrently and save state once at the end.
+
+        Each day has its own raw export, WIP and final files. Returns the final
+        workbook paths in input order, with None for days that failed.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def process(day):
+            async with semaphore:
+                return await self.process_workbook(persist=False, day=day)
+
+        paths = await asyncio.gather(*[process(day) for day in days])
+        self._save_state()
+        return paths
+
+    def _build_workbook(self, template_path, raw_data_path, wip_path, final_path):
+        """Build the final workbook from the template and the raw data export."""
+        num_data_rows = self._update_raw_import_sheet(raw_data_path, template_path, wip_path)
+        LOGGER.info(f"Updated Raw Import sheet with {num_data_rows} rows")
+        # The splice leaves sheet names and relationships as they are, so the template's cached mappings apply.
+        # The WIP archive is stored uncompressed; the final one gets the template's compression back.
+        compress_types = self._get_template_parts(template_path)[-1]
+        self._fix_workbook(wip_path, num_data_rows, final_path, self._get_sheet_mappings(template_path), compress_types)
+        LOGGER.info(f"Created final workbook: {final_path}")
+
+        if os.path.exists(wip_path):
+            os.remove(wip_path)
+            LOGGER.info(f"Removed temporary WIP file: {wip_path}")
 
     def _get_store_hours_for_date(self, date):
-        """Get store hours for the specified date."""
-        return tuple(self.hours_weekends if date.weekday() >= 5 else self.hours_weekdays)
+        """Get the (opening, closing) store hours for the specified date as time objects."""
+        return self._hours_weekends_obj if date.weekday() >= 5 else self._hours_weekdays_obj
     
     def _is_weekday(self, date: datetime.date) -> bool:
         """Check if the given date is a weekday (0=Monday, 6=Sunday)."""
         # 0-4 are the weekdays (Monday-Friday)
         return date.weekday() < 5
 
-    def _update_raw_import_sheet(self, raw_file, output_file):
-        """Update the Raw Import sheet in the output workbook."""
-        try:
-            LOGGER.info(f"Loading raw data from {raw_file}")
-            raw_wb = openpyxl.load_workbook(raw_file, data_only=True)
-            if "RAW" not in raw_wb.sheetnames:
-                raise ValueError("RAW sheet not found in exported data")
-            raw_sheet = raw_wb["RAW"]
-            data_rows = list(raw_sheet.iter_rows(min_row=2, values_only=True))
-            LOGGER.info(f"Loaded {len(data_rows)} rows from raw export")
-
-            LOGGER.info(f"Opening output workbook: {output_file}")
-            output_wb = openpyxl.load_workbook(output_file)
-            if "Raw Import" not in output_wb.sheetnames:
-                raise ValueError("Raw Import sheet not found in template")
-            output_sheet = output_wb["Raw Import"]
-
-            LOGGER.info("Clearing existing data from Raw Import sheet")
-            for row in output_sheet.iter_rows(min_row=2):
-                for cell in row:
-                    cell.value = None
+    def _update_raw_import_sheet(self, raw_file, template_path, output_file):
+        """Write the template to output_file with its Raw Import sheet filled from the raw export.
 
-            LOGGER.info("Copying data to Raw Import sheet")
-            for r_idx, row_data in enumerate(data_rows, start=2):
-                for c_idx, value in enumerate(row_data, start=1):
-                    output_sheet.cell(row=r_idx, column=c_idx).value = value
+        The template is copied part by part in one zip pass and the Raw Import
+        sheet XML is rebuilt from the raw export on the way, so the template is
+        never loaded into openpyxl. The template's header row and every other
+        part are kept as they are, apart from cached formula results.
+        """
+        try:
+            sheet_xml_path, head, tail, date_style, row_styles, parts, _ = self._get_template_parts(template_path)
 
             LOGGER.info(f"Saving updated workbook to {output_file}")
-            output_wb.save(output_file)
-            LOGGER.info(f"Raw Import sheet updated with {len(data_rows)} rows")
-            return len(data_rows)
+            # The WIP archive is read once by _fix_workbook, so its members are stored uncompressed
+            with zipfile.ZipFile(template_path, "r") as zip_in, \
+                    zipfile.ZipFile(output_file, "w", zipfile.ZIP_STORED) as zip_out:
+                for item in zip_in.infolist():
+                    if item.filename == _CALC_CHAIN_PATH:
+                        continue
+                    info = _zip_info(item, zipfile.ZIP_STORED)
+                    if item.filename == sheet_xml_path:
+                        with zip_out.open(info, "w") as sheet_out:
+                            num_rows = self._write_raw_import_sheet(sheet_out, head, tail, raw_file, date_style, row_styles)
+                        continue
+                    data = parts[item.filename] if item.filename in parts else zip_in.read(item.filename)
+                    zip_out.writestr(info, data)
+            LOGGER.info(f"Raw Import sheet updated with {num_rows} rows")
+            return num_rows
 
         except Exception as e:
             LOGGER.error(f"Error updating Raw Import sheet: {e}")
             raise
 
+    def _get_template_parts(self, template_path):
+        """Return the template parts prepared for the Raw Import splice, reusing them while the file is unchanged."""
+        stat = os.stat(template_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._template_parts_cache.get(template_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        LOGGER.info(f"Preparing template workbook: {template_path}")
+        with zipfile.ZipFile(template_path, "r") as zip_in:
+            template_parts = self._read_template_parts(zip_in, self._get_sheet_mappings(template_path))
+        self._template_parts_cache[template_path] = (signature, template_parts)
+        return template_parts
+
+    def _read_template_parts(self, zip_in, sheet_mappings):
+        """Prepare the template parts that change when the Raw Import sheet is spliced in.
+
+        Returns the Raw Import part name, the sheet XML before and after its data
+        rows, the cellXfs index of the added date style, the styles of its data
+        rows, the replacement bytes for the other edited parts and each member's
+        compression method.
+        """
+        if "Raw Import" not in sheet_mappings:
+            raise ValueError("Raw Import sheet not found in template")
+        sheet_xml_path = f"xl/worksheets/{sheet_mappings['Raw Import']}"
+        names = set(zip_in.namelist())
+        if sheet_xml_path not in names:
+            raise FileNotFoundError(f"Sheet XML file not found: {sheet_xml_path}")
+
+        sheet_xml = _FORMULA_CACHED_VALUE.sub(rb"\1", zip_in.read(sheet_xml_path))
+        end = _SHEET_DATA_END.search(sheet_xml)
+        if end is None:
+            raise ValueError("No sheetData found in Raw Import sheet")
+        if b":" in end.group():
+            raise ValueError("Raw Import sheet XML must use the default namespace")
+
+        # Keep the header row; everything from the first data row on is replaced, apart from its styles
+        head_end = end.start()
+        for row in _ROW_START.finditer(sheet_xml, 0, end.start()):
+            if int(row.group(1)) > 1:
+                head_end = row.start()
+                break
+        row_styles = self._read_row_styles(sheet_xml[head_end:end.start()])
+        if end.group().startswith(b"</"):
+            head, tail = sheet_xml[:head_end], sheet_xml[end.start():]
+        else:
+            head, tail = sheet_xml[:end.start()] + b"<sheetData>", b"</sheetData>" + sheet_xml[end.end():]
+        # The template's dimension no longer matches the data and is optional, so drop it
+        head = _DIMENSION.sub(b"", head, count=1)
+
+        styles_xml, date_style = self._add_date_style(zip_in.read("xl/styles.xml"))
+        parts = {
+            "xl/styles.xml": styles_xml,
+            "xl/workbook.xml": self._set_full_calc_on_load(zip_in.read("xl/workbook.xml")),
+        }
+        # Cached formula results are stale once the data changes; drop them, as an openpyxl save did,
+        # so nothing reads old values before the recalculation on load
+        for name in names:
+            if _WORKSHEET_PATH.fullmatch(name) and name != sheet_xml_path:
+                original = zip_in.read(name)
+                stripped = _FORMULA_CACHED_VALUE.sub(rb"\1", original)
+                if stripped != original:
+                    parts[name] = stripped
+        # The calculation chain lists formula cells that _fix_workbook may remove; Excel rebuilds it
+        if _CALC_CHAIN_PATH in names:
+            parts["xl/_rels/workbook.xml.rels"] = _CALC_CHAIN_REL.sub(b"", zip_in.read("xl/_rels/workbook.xml.rels"))
+            parts["[Content_Types].xml"] = _CALC_CHAIN_OVERRIDE.sub(b"", zip_in.read("[Content_Types].xml"))
+        compress_types = {item.filename: item.compress_type for item in zip_in.infolist()}
+        return sheet_xml_path, head, tail, date_style, row_styles, parts, compress_types
+
+    def _read_row_styles(self, rows_xml_bytes):
+        """Collect the row attributes and per-column cell styles of the template's Raw Import data rows.
+
+        Returns a mapping of row number to the row's extra attributes and the
+        cellXfs index of each styled column; rows with neither are left out.
+        """
+        row_styles = {}
+        row_num = 1
+        for row in _ROW_ELEMENT.finditer(rows_xml_bytes):
+            number = _ROW_NUMBER.search(row.group(1))
+            row_num = int(number.group(1)) if number else row_num + 1
+            styles = {}
+            column = 0
+            for cell in _CELL_ELEMENT.finditer(row.group(2) or b""):
+                ref = _CELL_COLUMN.search(cell.group(1))
+                column = _column_number(ref.group(1).decode()) if ref else column + 1
+                style = _STYLE_ATTR.search(cell.group(1))
+                if style and int(style.group(1)):
+                    styles[column] = int(style.group(1))
+            attrs = _ROW_POSITION_ATTRS.sub(b"", row.group(1)).decode().rstrip()
+            if attrs or styles:
+                row_styles[row_num] = (attrs, styles)
+        return row_styles
+
+    def _write_raw_import_sheet(self, sheet_out, head, tail, raw_file, date_style, row_styles=None, chunk_rows=1000):
+        """Write the Raw Import sheet XML with data rows from the raw export between head and tail; return the row count.
+
+        Data rows take the template's row and cell styles, and styled template rows past the data are kept empty.
+        """
+        LOGGER.info(f"Loading raw data from {raw_file}")
+        with open(raw_file, newline="") as f:
+            reader = csv.reader(f)
+            # The template keeps its own header row
+            next(reader, None)
+
+            LOGGER.info("Copying data to Raw Import sheet")
+            sheet_out.write(head)
+            num_rows = 0
+            chunk = []
+            for row_xml in rows_xml(map(_parse_raw_row, reader), first_row=2, date_style=date_style, row_styles=row_styles):
+                chunk.append(row_xml)
+                if len(chunk) >= chunk_rows:
+                    sheet_out.write("".join(chunk).encode())
+                    num_rows += len(chunk)
+                    chunk.clear()
+            num_rows += len(chunk)
+            if row_styles:
+                for row_num in sorted(row_styles):
+                    if row_num > num_rows + 1:
+                        chunk.extend(rows_xml([()], first_row=row_num, date_style=date_style, row_styles=row_styles))
+            sheet_out.write("".join(chunk).encode())
+            sheet_out.write(tail)
+        LOGGER.info(f"Loaded {num_rows} rows from raw export")
+        return num_rows
+
+    def _add_date_style(self, styles_xml):
+        """Append a date-time cell format to styles.xml and return the new XML and the format's cellXfs index."""
+        num_fmt_id = max([163] + [int(i) for i in _NUM_FMT_ID.findall(styles_xml)]) + 1
+        xf = f'<xf numFmtId="{num_fmt_id}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        styles_xml, num_xfs = self._append_style_child(styles_xml, "cellXfs", xf.encode())
+        if styles_xml is None:
+            raise ValueError("cellXfs not found in workbook styles")
+
+        num_fmt = f'<numFmt numFmtId="{num_fmt_id}" formatCode="{_DATE_FORMAT}"/>'.encode()
+        updated, _ = self._append_style_child(styles_xml, "numFmts", num_fmt)
+        if updated is None:
+            # numFmts must be the first child of styleSheet
+            start = _STYLESHEET_START.search(styles_xml)
+            if start is None:
+                raise ValueError("styleSheet not found in workbook styles")
+            updated = styles_xml[:start.end()] + b'<numFmts count="1">' + num_fmt + b"</numFmts>" + styles_xml[start.end():]
+        return updated, num_xfs - 1
+
+    def _append_style_child(self, styles_xml, tag, child):
+        """Append child to the styles.xml collection element tag, returning the new XML and the new item count.
+
+        Returns (None, 0) when the collection is missing.
+        """
+        match = re.search(rb'<%s\b([^>]*?)(?:/>|>(.*?)</%s>)' % (tag.encode(), tag.encode()), styles_xml, re.S)
+        if match is None:
+            return None, 0
+        items = match.group(2) or b""
+        count = items.count(child[:child.index(b" ")]) + 1
+        attrs = _COUNT_ATTR.sub(b"", match.group(1))
+        element = b'<%s%s count="%d">%s%s</%s>' % (tag.encode(), attrs, count, items, child, tag.encode())
+        return styles_xml[:match.start()] + element + styles_xml[match.end():], count
+
+    def _set_full_calc_on_load(self, workbook_xml):
+        """Mark the workbook for a full recalculation when opened, since cached formula results are stale."""
+        if b"<calcPr" in workbook_xml:
+            workbook_xml = re.sub(rb'\sfullCalcOnLoad="[^"]*"', b"", workbook_xml)
+            return workbook_xml.replace(b"<calcPr", b'<calcPr fullCalcOnLoad="1"', 1)
+        # calcPr follows definedNames (or the elements before it) in the workbook schema
+        anchors = list(_CALC_PR_ANCHOR.finditer(workbook_xml))
+        if not anchors:
+            raise ValueError("sheets not found in workbook.xml")
+        pos = anchors[-1].end()
+        return workbook_xml[:pos] + b'<calcPr fullCalcOnLoad="1"/>' + workbook_xml[pos:]
+
     def _get_sheet_mappings(self, excel_path):
-        """Extract sheet mappings from the Excel workbook."""
-        temp_dir = os.path.join(self.workbooks_dir, "temp_excel")
-        os.makedirs(temp_dir, exist_ok=True)
+        """Extract sheet mappings from the Excel workbook, reusing them while the file is unchanged."""
         try:
+            stat = os.stat(excel_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            cached = self._sheet_mappings_cache.get(excel_path)
+            if cached is not None and cached[0] == signature:
+                return dict(cached[1])
             with zipfile.ZipFile(excel_path, "r") as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            workbook_xml_path = os.path.join(temp_dir, "xl", "workbook.xml")
-            rels_xml_path = os.path.join(temp_dir, "xl", "_rels", "workbook.xml.rels")
-            if not os.path.exists(workbook_xml_path) or not os.path.exists(rels_xml_path):
-                raise FileNotFoundError(f"Required XML files not found in {excel_path}")
-
-            sheet_mapping = {}
-            wb_tree = ET.parse(workbook_xml_path)
-            wb_root = wb_tree.getroot()
-            ns = {
-                'ns': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
-                'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-            }
-            # Use fully qualified namespace for r:id
-            sheet_rel_map = {}
-            for sheet in wb_root.findall(".//ns:sheets/ns:sheet", ns):
-                sheet_name = sheet.attrib.get("name", "unknown")
-                sheet_rel_id = sheet.attrib.get("{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id")
-                if sheet_rel_id:
-                    sheet_rel_map[sheet_rel_id] = sheet_name
-                else:
-                    LOGGER.warning(f"Sheet '{sheet_name}' missing r:id attribute in {workbook_xml_path}")
-
-            rels_tree = ET.parse(rels_xml_path)
-            rels_root = rels_tree.getroot()
-            rels_ns = {'ns': 'http://schemas.openxmlformats.org/package/2006/relationships'}
-            for rel in rels_root.findall(".//ns:Relationship", rels_ns):
-                rel_id = rel.attrib.get("Id")
-                target = rel.attrib.get("Target")
-                if rel_id in sheet_rel_map and "worksheets" in target:
-                    sheet_mapping[sheet_rel_map[rel_id]] = os.path.basename(target)
-
-            LOGGER.info(f"Sheet mappings: {sheet_mapping}")
-            return sheet_mapping
-
+                sheet_mapping = self._read_sheet_mappings(zip_ref)
+            self._sheet_mappings_cache[excel_path] = (signature, sheet_mapping)
+            return dict(sheet_mapping)
         except Exception as e:
             LOGGER.error(f"Error extracting sheet mappings: {e}")
             raise
-        finally:
-            if os.path.exists(temp_dir) and "temp_excel" not in excel_path:
-                shutil.rmtree(temp_dir)
 
-    def _fix_workbook(self, wip_path, num_data_rows, final_path):
-        """Fix the workbook structure for row counts and formulas."""
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        temp_dir = os.path.join(self.workbooks_dir, f"temp_excel_{timestamp}")
+    def _read_sheet_mappings(self, zip_ref):
+        """Map sheet names to worksheet XML filenames using an open workbook archive."""
+        workbook_xml_path = "xl/workbook.xml"
+        rels_xml_path = "xl/_rels/workbook.xml.rels"
+        names = set(zip_ref.namelist())
+        if workbook_xml_path not in names or rels_xml_path not in names:
+            raise FileNotFoundError(f"Required XML files not found in {zip_ref.filename}")
+
+        sheet_mapping = {}
+        wb_root = ET.fromstring(zip_ref.read(workbook_xml_path))
+        ns = {
+            'ns': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+        }
+        # Use fully qualified namespace for r:id
+        sheet_rel_map = {}
+        for sheet in wb_root.findall(".//ns:sheets/ns:sheet", ns):
+            sheet_name = sheet.attrib.get("name", "unknown")
+            sheet_rel_id = sheet.attrib.get("{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id")
+            if sheet_rel_id:
+                sheet_rel_map[sheet_rel_id] = sheet_name
+            else:
+                LOGGER.warning(f"Sheet '{sheet_name}' missing r:id attribute in {workbook_xml_path}")
+
+        rels_root = ET.fromstring(zip_ref.read(rels_xml_path))
+        rels_ns = {'ns': 'http://schemas.openxmlformats.org/package/2006/relationships'}
+        for rel in rels_root.findall(".//ns:Relationship", rels_ns):
+            rel_id = rel.attrib.get("Id")
+            target = rel.attrib.get("Target")
+            if rel_id in sheet_rel_map and "worksheets" in target:
+                sheet_mapping[sheet_rel_map[rel_id]] = os.path.basename(target)
+
+        LOGGER.info(f"Sheet mappings: {sheet_mapping}")
+        return sheet_mapping
+
+    def _fix_workbook(self, wip_path, num_data_rows, final_path, sheet_mappings=None, compress_types=None):
+        """Fix the workbook structure for row counts and formulas.
+
+        The archive is rewritten member by member in memory; only the trimmed
+        sheets are edited and everything else is copied through unchanged.
+        Sheet mappings are read from the archive unless the caller already has them.
+        Each member keeps its compression method from compress_types, keyed by
+        member name, and members missing from it are deflated.
+        Without compress_types every member keeps its method from the input archive.
+        """
         try:
             if not os.path.exists(wip_path):
                 raise FileNotFoundError(f"WIP file not found: {wip_path}")
 
-            os.makedirs(temp_dir, exist_ok=True)
-            LOGGER.info(f"Created temp directory: {temp_dir}")
-            with zipfile.ZipFile(wip_path, "r") as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            sheet_mappings = self._get_sheet_mappings(wip_path)
-            namespaces = {
-                'ns': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
-                'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-            }
-            for prefix, uri in namespaces.items():
-                ET.register_namespace(prefix, uri)
-            ET.register_namespace('', 'http://schemas.openxmlformats.org/spreadsheetml/2006/main')
-
-            worksheets_dir = os.path.join(temp_dir, "xl", "worksheets")
-            if not os.path.exists(worksheets_dir):
-                raise FileNotFoundError(f"Worksheets directory not found: {worksheets_dir}")
-
-            sheets_to_process = ["Calibrated Values", "Bounded Calibrated", "Empty Shelf Tracker"]
-            for sheet_name in sheets_to_process:
-                if sheet_name not in sheet_mappings:
-                    LOGGER.warning(f"Sheet '{sheet_name}' not found in workbook. Skipping...")
-                    continue
-                sheet_xml_path = os.path.join(worksheets_dir, sheet_mappings[sheet_name])
-                if not os.path.exists(sheet_xml_path):
-                    LOGGER.error(f"Sheet XML file not found: {sheet_xml_path}")
-                    continue
-
-                LOGGER.info(f"Processing sheet: {sheet_name}")
-                tree = ET.parse(sheet_xml_path)
-                root = tree.getroot()
-                sheet_data = root.find(".//ns:sheetData", namespaces)
-                if sheet_data is None:
-                    LOGGER.warning(f"No sheetData found in {sheet_name}, skipping modifications")
-                    continue
-
-                rows_to_remove = [row for row in sheet_data.findall(".//ns:row", namespaces) if int(row.attrib.get("r", "0")) > num_data_rows + 1]
-                if rows_to_remove:
-                    first_row = rows_to_remove[0].attrib.get('r', "N/A")
-                    last_row = rows_to_remove[-1].attrib.get('r', "N/A")
-                    for row in rows_to_remove:
-                        sheet_data.remove(row)
-                    LOGGER.info(f"Removed {len(rows_to_remove)} excess rows ({first_row} to {last_row}) from {sheet_name}")
-
-                tree.write(sheet_xml_path, encoding="UTF-8", xml_declaration=True)
-                LOGGER.info(f"Saved modifications to {sheet_xml_path}")
-
-            LOGGER.info(f"Creating final workbook: {final_path}")
-            with zipfile.ZipFile(final_path, "w", zipfile.ZIP_DEFLATED) as zip_out:
-                for root_dir, _, files in os.walk(temp_dir):
-                    for file in files:
-                        file_path = os.path.join(root_dir, file)
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        zip_out.write(file_path, arcname)
+            with zipfile.ZipFile(wip_path, "r") as zip_in:
+                if sheet_mappings is None:
+                    sheet_mappings = self._read_sheet_mappings(zip_in)
+                names = set(zip_in.namelist())
+                if not any(name.startswith("xl/worksheets/") for name in names):
+                    raise FileNotFoundError(f"Worksheets directory not found in {wip_path}")
+
+                sheets_to_process = ["Calibrated Values", "Bounded Calibrated", "Empty Shelf Tracker"]
+                targets = {}
+                for sheet_name in sheets_to_process:
+                    if sheet_name not in sheet_mappings:
+                        LOGGER.warning(f"Sheet '{sheet_name}' not found in workbook. Skipping...")
+                        continue
+                    sheet_xml_path = f"xl/worksheets/{sheet_mappings[sheet_name]}"
+                    if sheet_xml_path not in names:
+                        LOGGER.error(f"Sheet XML file not found: {sheet_xml_path}")
+                        continue
+                    targets[sheet_xml_path] = sheet_name
+
+                LOGGER.info(f"Creating final workbook: {final_path}")
+                with zipfile.ZipFile(final_path, "w", zipfile.ZIP_DEFLATED) as zip_out:
+                    for item in zip_in.infolist():
+                        data = zip_in.read(item.filename)
+                        sheet_name = targets.get(item.filename)
+                        if sheet_name is not None:
+                            data = self._trim_sheet_rows(data, sheet_name, num_data_rows)
+                        if compress_types is None:
+                            compress_type = item.compress_type
+                        else:
+                            compress_type = compress_types.get(item.filename, zipfile.ZIP_DEFLATED)
+                        zip_out.writestr(_zip_info(item, compress_type), data)
 
             LOGGER.info(f"Successfully created final workbook: {final_path}")
             return final_path
@@ -781,10 +1152,30 @@ class StockReportEmail(Sensor):
         except Exception as e:
             LOGGER.error(f"Error fixing workbook: {e}")
             raise
-        finally:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-                LOGGER.info(f"Cleaned up temporary directory: {temp_dir}")
+
+    def _trim_sheet_rows(self, sheet_xml, sheet_name, num_data_rows):
+        """Remove rows past the last data row from a worksheet's XML and return the new XML.
+
+        The XML is scanned rather than parsed: rows are stored in ascending order,
+        so everything from the first excess row to the end of sheetData is cut out
+        and the rest of the document is kept byte for byte.
+        """
+        LOGGER.info(f"Processing sheet: {sheet_name}")
+        end = _SHEET_DATA_END.search(sheet_xml)
+        if end is None:
+            LOGGER.warning(f"No sheetData found in {sheet_name}, skipping modifications")
+            return sheet_xml
+
+        rows = list(_ROW_START.finditer(sheet_xml, 0, end.start()))
+        cut = len(rows)
+        while cut > 0 and int(rows[cut - 1].group(1)) > num_data_rows + 1:
+            cut -= 1
+        if cut == len(rows):
+            return sheet_xml
+
+        first_row, last_row = rows[cut].group(1).decode(), rows[-1].group(1).decode()
+        LOGGER.info(f"Removed {len(rows) - cut} excess rows ({first_row} to {last_row}) from {sheet_name}")
+        return sheet_xml[:rows[cut].start()] + sheet_xml[end.start():]
 
     def _get_daily_images(self, day_str):
         """Get all captured images for a specific day."""
@@ -798,7 +1189,15 @@ class StockReportEmail(Sensor):
         LOGGER.info(f"Found {len(image_files)} images for {day_str}")
         return image_files
 
-    async def send_report_if_ready(self):
+    async def _send_scheduled_report(self, slot: datetime.datetime):
+        """Send the report for a scheduled slot unless that slot was already sent."""
+        slot_ts = int(slot.timestamp())
+        if self.last_sent_slot_ts == slot_ts:
+            LOGGER.info(f"Report for send slot {slot} already sent, skipping")
+            return
+        await self.send_report_if_ready(slot_ts=slot_ts)
+
+    async def send_report_if_ready(self, slot_ts: Optional[int] = None):
         """Send a report if a processed workbook is available."""
         if not self.last_workbook_path or not os.path.exists(self.last_workbook_path):
             LOGGER.error("No processed workbook available to send report")
@@ -820,10 +1219,12 @@ class StockReportEmail(Sensor):
                     except Exception as e:
                         LOGGER.error(f"Error annotating image {img_path}: {e}")
 
-            await self.send_report(self.last_workbook_path, daily_images)
+            await self._send_report_with_retry(self.last_workbook_path, daily_images)
             self.last_sent_time = now
             self.total_reports_sent += 1
             self.report_status = "sent"
+            if slot_ts is not None:
+                self.last_sent_slot_ts = slot_ts
             self._save_state()
             LOGGER.info(f"Sent email report for {date_str} with {len(daily_images)} images")
 
@@ -835,84 +1236,156 @@ class StockReportEmail(Sensor):
     async def send_report(self, workbook_path, image_paths=None):
         """Send the report via email with images and workbook."""
         if not self.sendgrid_api_key:
-            LOGGER.error("No SendGrid API key configured")
-            return
+            raise ValueError("No SendGrid API key configured")
 
         try:
             LOGGER.info(f"Preparing report email with workbook: {os.path.basename(workbook_path)}")
             now = datetime.datetime.now()
             subject = f"Daily Report: {now.strftime('%Y-%m-%d')} - {self.location}"
-            body_text = f"The Excel workbook is attached with data for review.\nLocation: {self.location}\n"
+            body_text = self._email_text_head
+            html_content = self._email_html_head
             if image_paths:
                 body_text += f"Also attached are {len(image_paths)} images captured during the day.\n"
-            if self.teleop_url and self.teleop_url != "#":
-                body_text += f"Click here for the link to a real-time view of the store: {self.teleop_url}"
-
-            html_content = f"""<html><body><p>The Excel workbook is attached with data for review.</p><p>Location: {self.location}</p>"""
-            if image_paths:
                 html_content += f"<p>Also attached are {len(image_paths)} images captured during the day.</p>"
-            if self.teleop_url and self.teleop_url != "#":
-                html_content += f"""<p>Click <a href="{self.teleop_url}">here</a> for the link to a real-time view of the store.</p>"""
-            html_content += "</body></html>"
+            body_text += self._email_text_tail
+            html_content += self._email_html_tail
 
-            valid_recipients = [r for r in self.recipients if isinstance(r, str) and '@' in r]
+            valid_recipients = self._valid_recipients
             if not valid_recipients:
-                LOGGER.error("No valid recipients found")
-                return
+                raise ValueError("No valid recipients found")
 
-            message = Mail(
-                from_email=Email(self.sender_email, self.sender_name),
-                to_emails=valid_recipients,
-                subject=subject,
-                plain_text_content=Content("text/plain", body_text)
-            )
-            message.add_content(Content("text/html", html_content))
+            message = self._build_message(valid_recipients, subject, body_text, html_content)
 
             if image_paths:
-                def sort_by_timestamp(path):
-                    parts = os.path.basename(path).split('_')
-                    if len(parts) >= 2:
-                        try:
-                            return datetime.datetime.strptime(parts[0] + '_' + parts[1], "%Y%m%d_%H%M%S")
-                        except ValueError:
-                            return path
-                    return path
-
-                sorted_images = sorted(image_paths, key=sort_by_timestamp, reverse=True)
-                for img_path in sorted_images:
-                    try:
-                        with open(img_path, "rb") as f:
-                            img_content = base64.b64encode(f.read()).decode()
-                        img_name = os.path.basename(img_path)
-                        img_attachment = Attachment(
-                            FileContent(img_content), FileName(img_name), FileType("image/jpeg"), Disposition("attachment")
-                        )
-                        message.add_attachment(img_attachment)
-                        LOGGER.info(f"Added image attachment to report: {img_name}")
-                    except Exception as e:
-                        LOGGER.error(f"Error attaching image: {e}")
-
-            with open(workbook_path, "rb") as f:
-                wb_content = base64.b64encode(f.read()).decode()
+                # Filenames start with a fixed-width YYYYmmdd_HHMMSS stamp, so they sort chronologically as text
+                sorted_images = sorted(image_paths, key=os.path.basename, reverse=True)
+                encoded_images = await self._encode_files(sorted_images)
+                for img_path, img_content in zip(sorted_images, encoded_images):
+                    if isinstance(img_content, Exception):
+                        LOGGER.error(f"Error attaching image: {img_content}")
+                        continue
+                    img_name = os.path.basename(img_path)
+                    message.add_attachment(self._build_attachment(img_content, img_name, "image/jpeg"))
+                    LOGGER.info(f"Added image attachment to report: {img_name}")
+
+            wb_content = await asyncio.to_thread(self._encode_file, workbook_path)
             wb_name = os.path.basename(workbook_path)
-            wb_attachment = Attachment(
-                FileContent(wb_content), FileName(wb_name),
-                FileType("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"), Disposition("attachment")
-            )
-            message.add_attachment(wb_attachment)
+            message.add_attachment(self._build_attachment(
+                wb_content, wb_name, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            ))
             LOGGER.info(f"Added workbook attachment to report: {wb_name}")
 
             LOGGER.info(f"Sending email report to {len(valid_recipients)} recipients")
-            sg = SendGridAPIClient(self.sendgrid_api_key)
-            response = sg.send(message)
+            response = await self._send_email(message)
             LOGGER.info(f"Email sent via SendGrid API. Status code: {response.status_code}")
 
         except Exception as e:
             LOGGER.error(f"Failed to send report: {e}")
+            raise
+
+    async def _send_report_with_retry(self, workbook_path, image_paths=None, attempts=3):
+        """Send the report, retrying transient failures with exponential backoff."""
+        for attempt in range(1, attempts + 1):
+            try:
+                await self.send_report(workbook_path, image_paths)
+                return
+            except ValueError:
+                # Configuration problems won't fix themselves on retry
+                raise
+            except Exception as e:
+                if attempt == attempts:
+                    raise
+                delay = 2 ** attempt
+                LOGGER.warning(f"Send attempt {attempt}/{attempts} failed: {e}; retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    def _prepare_email_templates(self):
+        """Render the parts of the report email that only change on reconfigure."""
+        self._valid_recipients = [r for r in self.recipients if isinstance(r, str) and '@' in r]
+        self._email_text_head = f"The Excel workbook is attached with data for review.\nLocation: {self.location}\n"
+        self._email_html_head = f"<html><body><p>The Excel workbook is attached with data for review.</p><p>Location: {self.location}</p>"
+        self._email_text_tail = ""
+        self._email_html_tail = "</body></html>"
+        if self.teleop_url and self.teleop_url != "#":
+            self._email_text_tail = f"Click here for the link to a real-time view of the store: {self.teleop_url}"
+            self._email_html_tail = f"""<p>Click <a href="{self.teleop_url}">here</a> for the link to a real-time view of the store.</p></body></html>"""
+
+    def _build_message(self, recipients, subject, text_body, html_body):
+        """Build a SendGrid message with plain text and HTML bodies."""
+        from sendgrid.helpers.mail import Mail, Email, Content
+        message = Mail(
+            from_email=Email(self.sender_email, self.sender_name),
+            to_emails=recipients,
+            subject=subject,
+            plain_text_content=Content("text/plain", text_body)
+        )
+        message.add_content(Content("text/html", html_body))
+        return message
+
+    def _build_attachment(self, encoded_content: str, filename: str, file_type: str):
+        """Build a SendGrid attachment from base64-encoded content."""
+        from sendgrid.helpers.mail import Attachment, FileContent, FileName, FileType, Disposition
+        return Attachment(FileContent(encoded_content), FileName(filename), FileType(file_type), Disposition("attachment"))
+
+    def _encode_file(self, path: str) -> str:
+        """Read a file and return its contents base64-encoded for an attachment."""
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode("ascii")
+
+    async def _encode_files(self, paths, max_concurrency=8):
+        """Read and encode files concurrently, returning results in input order.
+
+        A failed file yields its exception in place of the encoded content.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def encode(path):
+            async with semaphore:
+                return await asyncio.to_thread(self._encode_file, path)
+
+        return await asyncio.gather(*[encode(path) for path in paths], return_exceptions=True)
+
+    def _get_sendgrid_client(self):
+        """Return the SendGrid client, creating it once per configuration."""
+        if self._sendgrid_client is None:
+            from sendgrid import SendGridAPIClient
+            self._sendgrid_client = SendGridAPIClient(self.sendgrid_api_key)
+        return self._sendgrid_client
+
+    async def _send_email(self, message):
+        """Send a message via SendGrid without blocking the event loop."""
+        return await asyncio.to_thread(self._get_sendgrid_client().send, message)
+
+    def _get_exporter(self) -> DataExporter:
+        """Return the data exporter, creating it once per configuration."""
+        if self._exporter is None:
+            self._exporter = DataExporter(
+                self.api_key_id, self.api_key, self.org_id, self.location, self.timezone, include_keys_regex=".*_raw"
+            )
+        return self._exporter
+
+    def _close_exporter(self):
+        """Drop the data exporter; its API connection closes once no export is using it."""
+        if self._exporter is not None:
+            self._exporter.release()
+            self._exporter = None
+
+    async def close(self):
+        """Stop background tasks and release the email client and API connection."""
+        stopping_tasks = self._cancel_tasks()
+        if stopping_tasks:
+            await asyncio.gather(*stopping_tasks, return_exceptions=True)
+        self._sendgrid_client = None
+        self._close_exporter()
+        LOGGER.info(f"Closed {self.name}")
 
     async def get_readings(self, *, extra: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, SensorReading]:
         """Get current sensor readings."""
         now = datetime.datetime.now()
+        # Monitoring may poll rapidly; serve repeat calls within the same second from cache
+        slot = int(now.timestamp())
+        if self._readings_cache is not None and slot == self._readings_cache_slot:
+            return self._readings_cache
         is_today_weekday = self._is_weekday(now.date())
         
         next_process = self._get_next_process_time(now)
@@ -949,6 +1422,7 @@ class StockReportEmail(Sensor):
         else:
             readings["include_images"] = False
 
+        self._readings_cache, self._readings_cache_slot = readings, slot
         return readings
 
     async def do_command(self, command: Dict[str, Any], *, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
@@ -956,22 +1430,30 @@ class StockReportEmail(Sensor):
         cmd = command.get("command", "")
 
         if cmd == "process_and_send":
-            date = command.get("date", datetime.datetime.now().strftime("%Y%m%d"))
+            day = command.get("date", datetime.datetime.now().strftime("%Y%m%d"))
             try:
                 timestamp = datetime.datetime.strptime(day, "%Y%m%d")
-                await self.process_workbook()
+                # send_report_if_ready saves state, so write it once at the end
+                await self.process_workbook(persist=False)
                 await self.send_report_if_ready()
                 return {"status": "completed", "message": f"Processed and sent report for {day}"}
             except ValueError:
                 return {"status": "error", "message": f"Invalid day format: {day}, use YYYYMMDD"}
 
         elif cmd == "process":
-            date = command.get("date", datetime.datetime.now().strftime("%Y%m%d"))
-            try:
-                await self.process_workbook()
-                return {"status": "completed", "message": f"Processed workbook for {day}", "path": self.last_workbook_path}
-            except ValueError:
-                return {"status": "error", "message": f"Invalid day format: {day}, use YYYYMMDD"}
+            requested = command.get("dates") or [command.get("date", datetime.datetime.now().strftime("%Y%m%d"))]
+            # Each day is processed once; repeats would race on the same WIP and final files
+            dates = {}
+            for day in requested:
+                try:
+                    dates.setdefault(datetime.datetime.strptime(day, "%Y%m%d").date(), day)
+                except ValueError:
+                    return {"status": "error", "message": f"Invalid day format: {day}, use YYYYMMDD"}
+            days = list(dates.values())
+            paths = await self.process_workbooks(list(dates))
+            if len(days) == 1:
+                return {"status": "completed", "message": f"Processed workbook for {days[0]}", "path": paths[0]}
+            return {"status": "completed", "message": f"Processed workbooks for {', '.join(days)}", "paths": dict(zip(days, paths))}
 
         elif cmd == "capture_image":
             if not self.include_images:
@@ -986,16 +1468,11 @@ class StockReportEmail(Sensor):
                 timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 subject = f"Test Report from {self.location}"
                 body = f"This is a test report from {self.name} at {self.location}.\nTime: {timestamp}"
-                message = Mail(
-                    from_email=Email(self.sender_email, self.sender_name),
-                    to_emails=self.recipients,
-                    subject=subject,
-                    plain_text_content=Content("text/plain", body)
-                )
                 html_body = body.replace("\n", "<br>")
-                message.add_content(Content("text/html", f"<html><body><p>{html_body}</p></body></html>"))
-                sg = SendGridAPIClient(self.sendgrid_api_key)
-                response = sg.send(message)
+                message = self._build_message(
+                    self.recipients, subject, body, f"<html><body><p>{html_body}</p></body></html>"
+                )
+                response = await self._send_email(message)
                 return {"status": "completed", "message": f"Test report sent with status code {response.status_code}"}
             except Exception as e:
                 return {"status": "error", "message": f"Failed to send test report: {str(e)}"}